@@ -0,0 +1,204 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from utils import ImageRecognitionUtils
+from motion_gate import MotionGate
+
+# Per-process model instance (and its motion gate) for the process-pool variant
+_process_utils = None
+_process_gate = None
+
+
+def _init_process_worker(gate_settings):
+    global _process_utils, _process_gate
+    _process_utils = ImageRecognitionUtils()
+    _process_gate = MotionGate(*gate_settings) if gate_settings is not None else None
+
+
+def _analyze_in_process(frame, rects):
+    output = analyze_frame(_process_utils, frame, rects, _process_gate)
+    if _process_gate is not None:
+        output["motion_gate"] = _process_gate.stats()
+    return output
+
+
+def analyze_frame(vision_utils, frame, rects, motion_gate=None):
+    """
+    Run object monitoring over every ROI of one frame.
+    `rects` are normalized (x1, y1, x2, y2) tuples, e.g. ROIManager.rect_list.
+    Returns {"objects": [[detection, ...], ...]}, one entry per ROI, with boxes
+    in frame coordinates.
+    With a MotionGate, detection only runs on ROIs whose content changed.
+    Color monitoring is not done here: ColorMonitor is cheap enough to run inline
+    and its debounce needs every frame, which this worker may drop.
+    """
+    rois = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in rects]
+    offsets = [(x1, y1) for x1, y1, _, _ in rects]
+    if motion_gate is None:
+        detections = vision_utils.detect_objects_batch(rois, offsets)
+    else:
+        detections = motion_gate.run(rois, rects, lambda indices: vision_utils.detect_objects_batch(
+            [rois[i] for i in indices], [offsets[i] for i in indices]))
+    return {"objects": detections}
+
+
+class AnalysisWorker:
+    """
+    Runs frame analysis off the caller's thread.
+    Submission policy is "drop if busy, keep newest": while a job is running,
+    at most one frame waits, and a newer submission replaces it.
+    """
+    def __init__(self, vision_utils=None, use_processes=False, motion_gate=None, stats=None,
+                 tracker=None):
+        """
+        `motion_gate` is a MotionGate, or None to run detection on every ROI every time.
+        `stats` is an optional PipelineStats that receives the "analysis" stage latency.
+        `tracker` is an ObjectTracker; when given, object results come from it as "tracks"
+        (thread mode only, since it logs through the caller's Logger).
+        """
+        self.use_processes = use_processes
+        self.pipeline_stats = stats
+        self.motion_gate = motion_gate
+        if tracker is not None and use_processes:
+            print("[Analysis] Tracking needs the thread worker; tracking disabled.")
+            tracker = None
+        self.tracker = tracker
+        self.gate_stats = None
+        if use_processes:
+            # The network can't be pickled, so each process loads its own (and gates on its own)
+            self.vision_utils = None
+            gate_settings = None
+            if motion_gate is not None:
+                gate_settings = (motion_gate.threshold, motion_gate.max_age, motion_gate.size)
+            self.executor = ProcessPoolExecutor(max_workers=1, initializer=_init_process_worker,
+                                                initargs=(gate_settings,))
+        else:
+            self.vision_utils = vision_utils or ImageRecognitionUtils()
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="Analysis")
+
+        self.lock = threading.Lock()
+        self.busy = False
+        self.pending = None
+        self.result = None
+        self.closed = False
+
+        # Counters
+        self.submitted = 0
+        self.completed = 0
+        self.dropped = 0
+
+    def submit(self, frame, timestamp, rects):
+        """
+        Queue a frame for analysis. Returns False if it replaced a waiting frame
+        instead of starting right away. The frame must not be modified afterwards.
+        """
+        job = {
+            "frame": frame,
+            "timestamp": timestamp,
+            "rects": list(rects),
+            "frame_time": time.monotonic(),
+        }
+        with self.lock:
+            if self.closed:
+                return False
+            self.submitted += 1
+            if self.busy:
+                if self.pending is not None:
+                    self.dropped += 1
+                self.pending = job
+                return False
+            self.busy = True
+        self._start(job)
+        return True
+
+    def _start(self, job):
+        # Called without the lock: a job that finishes right away runs _done inline
+        job["started"] = time.perf_counter()
+        try:
+            if self.use_processes:
+                future = self.executor.submit(_analyze_in_process, job["frame"], job["rects"])
+            elif self.tracker is not None:
+                future = self.executor.submit(self._track, job)
+            else:
+                future = self.executor.submit(analyze_frame, self.vision_utils, job["frame"],
+                                              job["rects"], self.motion_gate)
+        except RuntimeError:
+            # Executor shut down meanwhile
+            with self.lock:
+                self.busy = False
+                self.pending = None
+            return
+        future.add_done_callback(lambda f: self._done(f, job))
+
+    def _track(self, job):
+        tracks = self.tracker.update(job["frame"], job["rects"], job["timestamp"])
+        return {"objects": None, "tracks": tracks}
+
+    def _done(self, future, job):
+        try:
+            output = future.result()
+        except Exception as e:
+            output = None
+            print(f"[Analysis] Worker error: {e}")
+        if self.pipeline_stats is not None and output is not None:
+            self.pipeline_stats.record("analysis", time.perf_counter() - job["started"])
+            self.pipeline_stats.tick("analyzed")
+
+        with self.lock:
+            if output is not None:
+                self.completed += 1
+                if "motion_gate" in output:
+                    self.gate_stats = output.pop("motion_gate")
+                output.update({
+                    "id": self.completed,
+                    "timestamp": job["timestamp"],
+                    "rects": job["rects"],
+                    "frame_time": job["frame_time"],
+                    "completed_time": time.monotonic(),
+                })
+                self.result = output
+            job = None
+            if self.pending is not None and not self.closed:
+                job, self.pending = self.pending, None
+            else:
+                self.busy = False
+        if job is not None:
+            self._start(job)
+
+    def latest(self):
+        """
+        Return the most recent result dict (or None) without waiting.
+        Its "id" increases with every completed job.
+        """
+        with self.lock:
+            return self.result
+
+    @staticmethod
+    def age(result):
+        """
+        Seconds since the analyzed frame was submitted.
+        """
+        return time.monotonic() - result["frame_time"]
+
+    def stats(self):
+        with self.lock:
+            stats = {
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "dropped": self.dropped,
+                "busy": self.busy,
+            }
+            gate_stats = self.gate_stats
+        if self.motion_gate is not None and not self.use_processes:
+            gate_stats = self.motion_gate.stats()
+        if gate_stats is not None:
+            stats.update(gate_stats)
+        if self.tracker is not None:
+            stats.update(self.tracker.stats())
+        return stats
+
+    def shutdown(self):
+        with self.lock:
+            self.closed = True
+            self.pending = None
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,277 @@
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import cv2
+import numpy as np
+from camera import Camera, Frame, draw_timestamp
+from logger import Logger
+from roi_manager import ROIManager
+from utils import ImageRecognitionUtils
+from color_monitor import ColorMonitor
+from preview import PreviewRenderer
+from config import PREVIEW_WIDTH, MODEL_INPUT_SIZE
+
+
+class SyntheticSource:
+    """
+    Camera stand-in that generates frames: a fixed noise background with a
+    colored square moving across it. Same get_frame()/release() interface as Camera.
+    """
+    def __init__(self, width=1280, height=720, frame_rate=30, seed=0):
+        self.frame_rate = frame_rate
+        self.started = time.time()
+        self.width = width
+        self.height = height
+        rng = np.random.default_rng(seed)
+        self.background = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+        self.index = 0
+
+    def get_frame(self, consume=True):
+        frame = self.background.copy()
+        size = max(16, self.height // 8)
+        x = (self.index * 7) % max(1, self.width - size)
+        y = (self.index * 3) % max(1, self.height - size)
+        frame[y:y + size, x:x + size] = (0, 0, 255)
+        self.index += 1
+        return Frame(self.index, time.monotonic(), self.started + self.index / self.frame_rate, frame)
+
+    def release(self):
+        pass
+
+
+class FileSource:
+    """
+    Replays a video file through Camera, rewinding at the end so benchmarks can run any length.
+    """
+    def __init__(self, path, frame_rate=30):
+        self.path = path
+        self.camera = Camera(path, frame_rate)
+        self.frame_rate = frame_rate
+
+    def get_frame(self, consume=True):
+        record = self.camera.get_frame()
+        if record is None:
+            self.camera.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            record = self.camera.get_frame()
+        return record
+
+    def release(self):
+        self.camera.release()
+
+
+class StubNet:
+    """
+    Stands in for the YOLO network when models/yolov4-tiny.weights is absent.
+    Returns random outputs shaped like yolov4-tiny at the blob's input size
+    (507 and 2028 rows at 416x416), with a few confident rows, so
+    post-processing does realistic work.
+    """
+    STRIDES = (32, 16)
+
+    def __init__(self, seed=0):
+        self.rng = np.random.default_rng(seed)
+        self.batch = 1
+        self.size = 416
+
+    def setInput(self, blob, *args):
+        self.batch = blob.shape[0]
+        self.size = blob.shape[2]
+
+    def forward(self, names=None):
+        outputs = []
+        for stride in self.STRIDES:
+            rows = 3 * (self.size // stride) ** 2
+            out = np.zeros((self.batch, rows, 85), dtype=np.float32)
+            out[..., :4] = self.rng.random((self.batch, rows, 4), dtype=np.float32) * 0.5
+            out[..., 5:] = self.rng.random((self.batch, rows, 80), dtype=np.float32) * 0.3
+            hits = self.rng.random((self.batch, rows)) < 0.01
+            out[..., 5][hits] = 0.9
+            outputs.append(out[0] if self.batch == 1 else out)
+        return outputs
+
+
+def write_sample_video(path, source, frames=60):
+    """
+    Record frames from `source` into an MJPG file, for the file-backed benchmark.
+    """
+    frame = source.get_frame().image
+    height, width = frame.shape[:2]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), source.frame_rate, (width, height))
+    writer.write(frame)
+    for _ in range(frames - 1):
+        writer.write(source.get_frame().image)
+    writer.release()
+
+
+def grid_rois(count, width, height):
+    """
+    Lay out `count` equal ROIs on a grid covering the middle of the frame.
+    """
+    cols = int(np.ceil(np.sqrt(count)))
+    rows = int(np.ceil(count / cols))
+    cell_w = width // (cols + 1)
+    cell_h = height // (rows + 1)
+    rois = []
+    for i in range(count):
+        r, c = divmod(i, cols)
+        x1 = cell_w // 2 + c * cell_w + 4
+        y1 = cell_h // 2 + r * cell_h + 4
+        rois.append(((x1, y1), (x1 + cell_w - 8, y1 + cell_h - 8)))
+    return rois
+
+
+def measure(fn, iterations, warmup=3):
+    """
+    Time `fn` and return throughput and latency percentiles in milliseconds.
+    """
+    for _ in range(warmup):
+        fn()
+    samples = np.empty(iterations)
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        samples[i] = time.perf_counter() - t0
+    ms = samples * 1000
+    total = samples.sum()
+    return {
+        "iterations": iterations,
+        "throughput_per_s": iterations / total if total > 0 else 0.0,
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p90_ms": float(np.percentile(ms, 90)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+    }
+
+
+def run_benchmarks(width=1280, height=720, frames=100, roi_counts=(1, 4, 16), video=None,
+                   input_size=MODEL_INPUT_SIZE):
+    results = {
+        "machine": {
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+        },
+        "settings": {"width": width, "height": height, "frames": frames, "roi_counts": list(roi_counts),
+                     "input_size": input_size},
+        "stages": {},
+    }
+
+    vision_utils = ImageRecognitionUtils(input_size=input_size)
+    results["settings"]["stub_network"] = vision_utils.yolo_net is None
+    if vision_utils.yolo_net is None:
+        print("[Benchmark] YOLO weights missing, using a stub network (post-processing only).")
+        vision_utils.yolo_net = StubNet()
+        vision_utils.output_layers = ["yolo_30", "yolo_37"]
+
+    source = SyntheticSource(width, height)
+    frame = source.get_frame().image
+    stages = results["stages"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Capture
+        stages["capture_synthetic"] = measure(source.get_frame, frames)
+        results["settings"]["video"] = video or "generated"
+        if video is None:
+            video = os.path.join(tmp, "sample.avi")
+            write_sample_video(video, SyntheticSource(width, height, seed=1))
+        file_source = FileSource(video)
+        stages["capture_file"] = measure(file_source.get_frame, frames)
+
+        # Logging
+        logger = Logger(os.path.join(tmp, "logs", "bench_log.csv"))
+        stages["logger_log"] = measure(lambda: logger.log(None, "benchmark event"), frames * 10)
+        t0 = time.perf_counter()
+        logger.close()
+        stages["logger_close_ms"] = (time.perf_counter() - t0) * 1000
+
+        # Preview rendering (PIL side of display_frame; Tk paste excluded)
+        renderer = PreviewRenderer(PREVIEW_WIDTH)
+        stages["display_frame"] = measure(lambda: renderer.render(frame), frames)
+
+        for count in roi_counts:
+            roi_manager = ROIManager()
+            for start, end in grid_rois(count, width, height):
+                roi_manager.add_box(start, end)
+            rects = roi_manager.rect_list
+            crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in rects]
+            offsets = [(x1, y1) for x1, y1, _, _ in rects]
+            monitor = ColorMonitor((127, 127, 127), downscale=2)
+            canvas = frame.copy()
+            key = f"{count}_rois"
+
+            stages[f"draw_rois/{key}"] = measure(lambda: roi_manager.draw_rois(canvas), frames)
+            stages[f"detect_color_change/{key}"] = measure(
+                lambda: [vision_utils.detect_color_change(c, (0, 0, 255)) for c in crops], frames)
+            stages[f"color_monitor/{key}"] = measure(lambda: monitor.update(frame, rects), frames)
+            stages[f"detect_objects/{key}"] = measure(
+                lambda: [vision_utils.detect_objects(c) for c in crops], max(10, frames // 4))
+            stages[f"detect_objects_batch/{key}"] = measure(
+                lambda: vision_utils.detect_objects_batch(crops, offsets), max(10, frames // 4))
+
+            # Whole frame pipeline, as the GUI loop runs it (without Tk)
+            pipeline_logger = Logger(os.path.join(tmp, "logs", f"pipeline_{count}.csv"))
+            pipeline_monitor = ColorMonitor((127, 127, 127), downscale=2, logger=pipeline_logger)
+
+            def pipeline():
+                record = source.get_frame()
+                current, timestamp = record.image, record.timestamp
+                shown = current.copy()
+                draw_timestamp(shown, timestamp)
+                roi_manager.draw_rois(shown)
+                pipeline_monitor.update(current, rects, timestamp)
+                rois = [current[y1:y2, x1:x2] for x1, y1, x2, y2 in rects]
+                vision_utils.detect_objects_batch(rois, offsets)
+                renderer.render(shown)
+
+            stages[f"pipeline/{key}"] = measure(pipeline, max(10, frames // 4))
+            pipeline_logger.close()
+
+        file_source.release()
+
+    results["model"] = vision_utils.stats()
+    return results
+
+
+def print_results(results):
+    for stage, stats in results["stages"].items():
+        if isinstance(stats, dict):
+            print(f"[Benchmark] {stage:<34} {stats['throughput_per_s']:10.1f}/s  "
+                  f"p50 {stats['p50_ms']:8.3f} ms  p99 {stats['p99_ms']:8.3f} ms")
+        else:
+            print(f"[Benchmark] {stage:<34} {stats:10.3f} ms")
+    model = results.get("model", {})
+    if model.get("load_ms") is not None:
+        print(f"[Benchmark] model load {model['load_ms']:.1f} ms, warm-up {model['warmup_ms']:.1f} ms, "
+              f"{model['mean_inference_ms']:.2f} ms per inference at input {results['settings']['input_size']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the monitoring hot paths without a webcam.")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--frames", type=int, default=100, help="Iterations per stage")
+    parser.add_argument("--rois", default="1,4,16", help="Comma-separated ROI counts")
+    parser.add_argument("--video", help="Recorded file for the file-backed source (default: generated)")
+    parser.add_argument("--input-size", default=str(MODEL_INPUT_SIZE),
+                        help="Network input size: 320, 416, 608 or auto")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON results file")
+    args = parser.parse_args(argv)
+
+    roi_counts = [int(n) for n in args.rois.split(",")]
+    input_size = args.input_size if args.input_size == "auto" else int(args.input_size)
+    results = run_benchmarks(args.width, args.height, args.frames, roi_counts, args.video, input_size)
+    print_results(results)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"[Benchmark] Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,234 @@
+import threading
+import time
+from collections import deque
 import cv2
-from datetime import datetime
+from logger import format_timestamp
+from frame_bus import FrameBusPublisher
+
+
+class Frame:
+    """
+    One captured frame: sequence number, monotonic capture time, wall-clock
+    time (time.time()) and the raw pixels, exactly as the camera delivered them.
+    `image` is shared with the capture buffer: copy it before drawing on it.
+    """
+    __slots__ = ("seq", "time", "wall_time", "image", "_timestamp")
+
+    def __init__(self, seq, capture_time, wall_time, image):
+        self.seq = seq
+        self.time = capture_time
+        self.wall_time = wall_time
+        self.image = image
+        self._timestamp = None
+
+    @property
+    def timestamp(self):
+        """
+        Log-format wall-clock string, formatted on first use.
+        """
+        if self._timestamp is None:
+            self._timestamp = format_timestamp(self.wall_time)
+        return self._timestamp
+
+
+def draw_timestamp(image, timestamp):
+    """
+    Burn the capture timestamp into a display or recording copy of a frame.
+    """
+    cv2.putText(image, timestamp, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+
+
+class CaptureEngine:
+    """
+    Background capture thread that grabs frames continuously into a bounded
+    ring buffer. Consumers never block on the device: they ask for the latest
+    frame, the next frame after a sequence number, or the last K frames.
+    """
+    def __init__(self, read_fn, buffer_size=8, max_failures=30):
+        self.read_fn = read_fn
+        self.buffer = deque(maxlen=buffer_size)
+        self.max_failures = max_failures
+        self.lock = threading.Condition()
+        self.thread = None
+        self.running = False
+
+        # Counters
+        self.seq = 0                # Sequence number of the newest captured frame
+        self.captured = 0
+        self.dropped = 0            # Frames the consumer never saw
+        self.duplicates = 0         # Times the consumer got a frame it already had
+        self.last_consumed = 0
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="CaptureEngine", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+            self.thread = None
+        with self.lock:
+            self.lock.notify_all()
+
+    def _run(self):
+        failures = 0
+        while self.running:
+            frame = self.read_fn()
+            if frame is None:
+                failures += 1
+                if failures >= self.max_failures:
+                    print("[Camera] Capture source stopped delivering frames.")
+                    break
+                time.sleep(0.01)
+                continue
+            failures = 0
+            with self.lock:
+                self.seq += 1
+                self.captured += 1
+                frame.seq = self.seq
+                self.buffer.append(frame)
+                self.lock.notify_all()
+        self.running = False
+
+    def latest(self, consume=True):
+        """
+        Return the newest buffered Frame, or None.
+        The same Frame is returned again until a newer one arrives (compare
+        `seq`), except once capture has stopped: then None follows the last one.
+        With consume=True the dropped/duplicate counters are updated for the
+        consuming loop; side readers (e.g. photos) should pass consume=False.
+        """
+        with self.lock:
+            if not self.buffer:
+                return None
+            entry = self.buffer[-1]
+            if not consume:
+                return entry
+            seq = entry.seq
+            if seq == self.last_consumed:
+                if not self.running:
+                    return None
+                self.duplicates += 1
+            else:
+                self.dropped += max(0, seq - self.last_consumed - 1)
+                self.last_consumed = seq
+            return entry
+
+    def next_after(self, seq, timeout=0):
+        """
+        Return the oldest buffered Frame newer than `seq`, or None.
+        Waits up to `timeout` seconds (0 = don't wait).
+        """
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            while True:
+                for entry in self.buffer:
+                    if entry.seq > seq:
+                        return entry
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.running:
+                    return None
+                self.lock.wait(remaining)
+
+    def last(self, k):
+        """
+        Return up to the last `k` buffered Frames, oldest first.
+        """
+        with self.lock:
+            if k <= 0:
+                return []
+            return list(self.buffer)[-k:]
+
+    def stats(self):
+        with self.lock:
+            return {
+                "captured": self.captured,
+                "dropped": self.dropped,
+                "duplicates": self.duplicates,
+                "buffered": len(self.buffer),
+            }
+
 
 class Camera:
-    def __init__(self, source=0, frame_rate=15):
+    def __init__(self, source=0, frame_rate=15, threaded=False, buffer_size=8,
+                 frame_bus=None, frame_bus_slots=4):
+        """
+        `frame_bus` is a shared-memory name to publish every captured frame
+        under for other local processes (see frame_bus.FrameBusClient), or None.
+        """
+        # Before opening the device: raises if another process is publishing under this name
+        self.publisher = FrameBusPublisher(frame_bus, frame_bus_slots) if frame_bus else None
         self.cap = cv2.VideoCapture(source)
         self.frame_rate = frame_rate
+        self.seq = 0
+        self.footage_start = None
+        self.footage_fps = None
+        self.engine = None
+        if threaded:
+            # Keep the driver queue short; the ring buffer does the buffering now
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            self.engine = CaptureEngine(self._read, buffer_size)
+            self.engine.start()
 
-    def get_frame(self):
-        ret, frame = self.cap.read()
+    def _read(self):
+        ret, image = self.cap.read()
         if not ret:
-            return None, None
-        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        cv2.putText(frame, timestamp, (10, 30),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-        return frame, timestamp
+            return None
+        # Counts successful reads, like the engine's sequence numbers in threaded mode
+        self.seq += 1
+        if self.footage_start is not None:
+            seconds = (self.cap.get(cv2.CAP_PROP_POS_FRAMES) - 1) / self.footage_fps
+            frame = Frame(self.seq, seconds, self.footage_start + seconds, image)
+        else:
+            frame = Frame(self.seq, time.monotonic(), time.time(), image)
+        if self.publisher is not None:
+            self.publisher.publish(frame.seq, frame.time, frame.wall_time, image)
+        return frame
+
+    def use_footage_clock(self, start):
+        """
+        Time a video file's frames by their position in the footage instead of
+        when they are read: `time` is seconds into the file and `wall_time`
+        `start` (a datetime) plus that, so processing faster than real time
+        still logs the footage's timestamps and durations.
+        """
+        self.footage_fps = self.cap.get(cv2.CAP_PROP_FPS) or self.frame_rate
+        self.footage_start = start.timestamp()
+
+    def footage_duration(self):
+        """
+        Length of a video file in seconds, from its frame count and rate.
+        """
+        frames = self.cap.get(cv2.CAP_PROP_FRAME_COUNT)
+        return frames / (self.cap.get(cv2.CAP_PROP_FPS) or self.frame_rate)
+
+    def frame_size(self):
+        """
+        (width, height) reported by the capture device, or None if it doesn't say.
+        """
+        width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        return (width, height) if width > 0 and height > 0 else None
+
+    def get_frame(self, consume=True):
+        """
+        Return the newest Frame, or None. Its pixels are raw (no overlays) and,
+        in threaded mode, shared with the ring buffer, so don't draw on them.
+        In threaded mode the same Frame repeats until a new one is captured, and
+        None is returned once the capture thread has stopped.
+        """
+        if self.engine is None:
+            return self._read()
+        return self.engine.latest(consume)
 
     def release(self):
+        if self.engine is not None:
+            self.engine.stop()
         if self.cap.isOpened():
             self.cap.release()
+        if self.publisher is not None:
+            self.publisher.close()
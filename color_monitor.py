@@ -0,0 +1,139 @@
+import time
+import cv2
+import numpy as np
+
+# Color spaces the monitor can compare in, and how to get there from BGR
+COLOR_CONVERSIONS = {
+    "bgr": None,
+    "lab": cv2.COLOR_BGR2LAB,
+    "hsv": cv2.COLOR_BGR2HSV,
+}
+
+
+class ColorMonitor:
+    """
+    Tracks the mean color of every ROI against a target color.
+    Means for all ROIs come from one integral image per frame (optionally of a
+    downscaled frame). A ROI flips to "changed" once its distance to the target
+    exceeds `threshold` for `debounce_frames` frames in a row, and flips back once
+    it stays below `threshold - hysteresis` as long. Only those transitions are
+    reported and logged.
+    """
+    def __init__(self, target_bgr, threshold=30, hysteresis=5, debounce_frames=3,
+                 color_space="bgr", downscale=1, logger=None):
+        self.color_space = color_space.lower()
+        if self.color_space not in COLOR_CONVERSIONS:
+            raise ValueError(f"Unsupported color space: {color_space}")
+        self.threshold = threshold
+        self.hysteresis = hysteresis
+        self.debounce_frames = max(1, debounce_frames)
+        self.downscale = max(1, int(downscale))
+        self.logger = logger
+        self.target = self._convert(np.uint8([[target_bgr]])).reshape(3).astype(np.float64)
+        self.reset(0)
+
+    def _convert(self, img):
+        code = COLOR_CONVERSIONS[self.color_space]
+        return img if code is None else cv2.cvtColor(img, code)
+
+    def reset(self, count):
+        """
+        Forget all ROI state, e.g. after ROIs were added or cleared.
+        """
+        self.changed = np.zeros(count, dtype=bool)
+        self.streak = np.zeros(count, dtype=np.int32)
+        self.changed_at = [None] * count       # (timestamp, monotonic time) of the last change
+
+    def means(self, frame, rects):
+        """
+        Mean color (in the monitor's color space) of each (x1, y1, x2, y2) rect.
+        Rows for empty rects are NaN.
+        """
+        rects = np.asarray(rects, dtype=np.int64).reshape(-1, 4)
+        if len(rects) == 0:
+            return np.empty((0, 3))
+
+        img = frame[:, :, :3]
+        if self.downscale > 1:
+            h, w = img.shape[:2]
+            img = cv2.resize(img, (max(1, w // self.downscale), max(1, h // self.downscale)),
+                             interpolation=cv2.INTER_AREA)
+            # Round outward so small ROIs don't vanish
+            d = self.downscale
+            rects = np.concatenate([rects[:, :2] // d, -(-rects[:, 2:] // d)], axis=1)
+        img = self._convert(np.ascontiguousarray(img))
+
+        h, w = img.shape[:2]
+        x1 = np.clip(rects[:, 0], 0, w)
+        y1 = np.clip(rects[:, 1], 0, h)
+        x2 = np.clip(rects[:, 2], 0, w)
+        y2 = np.clip(rects[:, 3], 0, h)
+
+        integral = cv2.integral(img, sdepth=cv2.CV_64F)
+        sums = integral[y2, x2] - integral[y1, x2] - integral[y2, x1] + integral[y1, x1]
+        area = ((x2 - x1) * (y2 - y1)).astype(np.float64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = sums / area[:, None]
+        means[area <= 0] = np.nan
+        return means
+
+    def update(self, frame, rects, timestamp=None, now=None):
+        """
+        Process one frame and return the list of state-transition events.
+        """
+        if len(rects) != len(self.changed):
+            self.reset(len(rects))
+        if len(rects) == 0:
+            return []
+        return self.update_means(self.means(frame, rects), timestamp, now)
+
+    def update_means(self, means, timestamp=None, now=None):
+        """
+        Same as update(), from ROI means computed elsewhere (e.g. in another process).
+        """
+        if len(means) != len(self.changed):
+            self.reset(len(means))
+        if len(means) == 0:
+            return []
+        now = time.monotonic() if now is None else now
+
+        distance = np.linalg.norm(means - self.target, axis=1)
+        valid = ~np.isnan(distance)
+
+        # A ROI is pushing towards a flip when it sits on the other side of its band
+        leaving = ~self.changed & (distance > self.threshold)
+        returning = self.changed & (distance < self.threshold - self.hysteresis)
+        pushing = valid & (leaving | returning)
+        self.streak = np.where(pushing, self.streak + 1, 0)
+        flips = np.flatnonzero(self.streak >= self.debounce_frames)
+
+        events = []
+        for i in flips:
+            self.streak[i] = 0
+            self.changed[i] = not self.changed[i]
+            mean = tuple(round(float(v), 1) for v in means[i])
+            event = {"roi": int(i) + 1, "timestamp": timestamp, "mean": mean,
+                     "distance": float(distance[i])}
+            if self.changed[i]:
+                event["event"] = "changed"
+                self.changed_at[i] = (timestamp, now)
+            else:
+                event["event"] = "returned"
+                since, started = self.changed_at[i] or (None, now)
+                event["changed_at"] = since
+                event["duration"] = now - started
+                self.changed_at[i] = None
+            events.append(event)
+            self._log(event)
+        return events
+
+    def _log(self, event):
+        space = self.color_space.upper()
+        if event["event"] == "changed":
+            message = f"ROI {event['roi']} color changed: Mean {space}={event['mean']}"
+        else:
+            message = (f"ROI {event['roi']} color returned after {event['duration']:.1f}s "
+                       f"(changed at {event['changed_at']}): Mean {space}={event['mean']}")
+        print(f"[Colors] {message}")
+        if self.logger is not None:
+            self.logger.log(event["timestamp"], message)
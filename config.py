@@ -1,8 +1,52 @@
 # Configuration file
 VIDEO_SOURCE = 0              # Default webcam
 FRAME_RATE = 15               # Frames per second
+CAPTURE_THREADED = True       # Grab frames on a background thread
+CAPTURE_BUFFER_SIZE = 8       # Frames kept in the capture ring buffer
+FRAME_BUS = None              # Shared-memory name to publish frames under for other processes, e.g. "labbot_frames"
+FRAME_BUS_SLOTS = 4           # Frames kept in the shared ring buffer
 CAPTURE_INTERVAL = 5          # Seconds for interval photo capture
+PHOTO_FORMAT = "jpg"          # "jpg", "png" or "webp"
+PHOTO_QUALITY = 95            # JPEG quality 0-100, WebP 1-100 (101 = lossless)
+PHOTO_PNG_COMPRESSION = 3     # PNG compression level 0-9 (higher = smaller but slower)
+PHOTO_WORKERS = 2             # Threads encoding and writing photos
+PHOTO_QUEUE_SIZE = 32         # Photos waiting to be written before new ones are dropped
 OUTPUT_DIR = "logs/"
 LOG_FILE = OUTPUT_DIR + "experiment_log.csv"
+FOOTAGE_DIR = "footages/"
+RECORD_CODEC = "XVID"         # "MJPG", "XVID" or "mp4v"
+RECORD_SEGMENT_SECONDS = 600  # Start a new video file after this many seconds (None = never)
+RECORD_SEGMENT_MB = 1024      # ...or once a file reaches this size (None = never)
+RECORD_QUEUE_SIZE = 64        # Frames waiting to be encoded before new ones are dropped
+LOG_FLUSH_SIZE = 100          # Write the log after this many queued events...
+LOG_FLUSH_INTERVAL = 1.0      # ...or after this many seconds
+LOG_MAX_BYTES = 10 * 1024 * 1024  # Rotate the log file past this size (None = never)
+LOG_ROTATE_DAILY = False      # Also start a new log file every day
 WINDOW_TITLE = "Experiment Monitoring Tool"
+PREVIEW_WIDTH = 960           # Preview is scaled down to this width (None = full resolution)
+PREVIEW_FPS = 15              # Preview refresh rate, independent of capture and analysis
+STATS_WINDOW = 300            # Latency samples kept per pipeline stage
+STATS_FILE = OUTPUT_DIR + "pipeline_stats.prom"  # Periodic stats dump (None = off)
+STATS_FORMAT = "prometheus"   # "prometheus" (overwritten) or "csv" (appended)
+STATS_INTERVAL = 10           # Seconds between stats dumps
 ROI_COLOR = (0, 255, 0)       # Green for ROI box
+ROI_LAYOUT_FILE = OUTPUT_DIR + "roi_layout.json"  # ROIs are restored from / saved to here (None = off)
+COLOR_THRESHOLD = 30          # Distance from the target color that counts as a change
+COLOR_HYSTERESIS = 5          # Must fall this far below the threshold to count as returned
+COLOR_DEBOUNCE_FRAMES = 3     # Consecutive frames needed before a change/return is reported
+COLOR_SPACE = "bgr"           # "bgr", "lab" or "hsv"
+COLOR_DOWNSCALE = 2           # Average colors on a frame shrunk by this factor
+MODEL_LAZY_LOAD = True        # Load YOLO in the background on first use instead of at startup
+MODEL_INPUT_SIZE = 416        # Network input: 320 (fastest), 416, 608 (most accurate) or "auto" (from ROI size)
+MODEL_BACKEND = "opencv"      # OpenCV DNN backend: "opencv", "openvino", "cuda", "vulkan"
+MODEL_TARGET = "cpu"          # DNN target/precision: "cpu", "cpu_fp16", "opencl", "opencl_fp16", "cuda", "cuda_fp16"
+ANALYSIS_USE_PROCESSES = False # Run detection in a worker process instead of a thread
+MOTION_GATE = True            # Skip detection on ROIs whose content hasn't changed
+MOTION_THRESHOLD = 8.0        # Mean gray-level difference (0-255) that counts as a change
+MOTION_MAX_AGE = 30.0         # Re-run detection at least this often (seconds) per ROI
+TRACKING = False              # Detect every TRACK_DETECT_INTERVAL frames and track objects in between
+TRACK_DETECT_INTERVAL = 10    # Frames between full detections while tracking
+TRACK_BACKEND = "iou"         # "iou" (velocity + IoU matching), or OpenCV "kcf", "csrt", "mil" if available
+TRACK_IOU_THRESHOLD = 0.3     # Minimum overlap to keep a track's ID across detections
+TRACK_MAX_MISSED = 3          # Detections a track may go unseen before it is dropped
+TRACK_DWELL_SECONDS = 10.0    # Log a dwell event once a track stays in a ROI this long
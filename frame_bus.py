@@ -0,0 +1,311 @@
+"""
+Shared-memory frame bus: the capture process publishes every frame into a
+ring buffer in `multiprocessing.shared_memory`, and any number of local
+processes read them as NumPy views, without sockets, encoding or copies.
+
+Client usage (only needs numpy):
+
+    from frame_bus import FrameBusClient
+    bus = FrameBusClient("labbot_frames")
+    frame = bus.latest()            # or bus.next_after(seq, timeout)
+    if frame is not None:
+        process(frame.image)        # view into shared memory
+        if not bus.is_current(frame):
+            ...                     # the slot was overwritten meanwhile; discard the result
+"""
+import argparse
+import os
+import time
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+
+MAGIC = 0x4C414246   # "LABF"
+VERSION = 2
+
+# Global header: uint64 fields
+HEADER_FIELDS = 8
+H_MAGIC, H_VERSION, H_SLOTS, H_SLOT_BYTES, H_LATEST, H_CLOSED, H_PID = range(7)
+
+# Per-slot header: uint64 fields (times are float64 stored in the same words)
+SLOT_FIELDS = 8
+S_BEGIN, S_END, S_TIME, S_WALL_TIME, S_HEIGHT, S_WIDTH, S_CHANNELS = range(7)
+
+# Buses published by this process; their resource-tracker entry belongs to the publisher
+_published = set()
+
+
+class BusFrame:
+    """
+    A frame read from the bus. `image` is a read-only view into shared memory
+    that stays valid until the publisher wraps around the ring to this slot.
+    """
+    __slots__ = ("seq", "time", "wall_time", "image", "slot")
+
+    def __init__(self, seq, capture_time, wall_time, image, slot):
+        self.seq = seq
+        self.time = capture_time
+        self.wall_time = wall_time
+        self.image = image
+        self.slot = slot
+
+
+def _layout(shm, slots, slot_bytes):
+    """
+    NumPy views of the header, the slot headers and the slot pixel areas.
+    """
+    header = np.ndarray((HEADER_FIELDS,), dtype=np.uint64, buffer=shm.buf)
+    offset = header.nbytes
+    meta = np.ndarray((slots, SLOT_FIELDS), dtype=np.uint64, buffer=shm.buf, offset=offset)
+    offset += meta.nbytes
+    data = np.ndarray((slots, slot_bytes), dtype=np.uint8, buffer=shm.buf, offset=offset)
+    return header, meta, meta.view(np.float64), data
+
+
+def _pid_alive(pid):
+    if os.name == "nt":
+        # Named shared memory goes away with its last handle there, so an existing bus is in use
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _reclaim_stale(name):
+    """
+    Remove a bus left behind by a publisher that died without closing it.
+    Raises FileExistsError if `name` belongs to a live publisher or isn't a frame bus.
+    """
+    if name in _published:
+        raise FileExistsError(f"Frame bus '{name}' is already published by this process")
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    is_bus = False
+    pid = 0
+    stale = False
+    if shm.size >= 8 * HEADER_FIELDS:
+        header = np.ndarray((HEADER_FIELDS,), dtype=np.uint64, buffer=shm.buf)
+        is_bus = header[H_MAGIC] == MAGIC and header[H_VERSION] == VERSION
+        pid = int(header[H_PID])
+        stale = is_bus and bool(header[H_CLOSED] or not _pid_alive(pid))
+        del header
+    shm.close()
+    if not stale:
+        # Attaching registered it with our resource tracker; it isn't ours to unlink
+        resource_tracker.unregister(shm._name, "shared_memory")
+        if is_bus:
+            raise FileExistsError(f"Frame bus '{name}' is already published by process {pid}")
+        raise FileExistsError(f"Shared memory '{name}' exists and is not a frame bus")
+    print(f"[FrameBus] Removing stale bus '{name}' left by process {pid}")
+    shm.unlink()
+
+
+class FrameBusPublisher:
+    """
+    Writes frames into a named shared-memory ring of `slots` frames.
+    The block is created on the first frame, sized for that frame's shape.
+    Each slot is guarded by a sequence lock (begin/end sequence numbers), so
+    readers can tell a complete frame from one being overwritten.
+    """
+    def __init__(self, name, slots=4):
+        """
+        Raises FileExistsError if another live publisher already uses `name`.
+        """
+        self.name = name
+        self.slots = max(2, int(slots))
+        self.shm = None
+        self.slot_bytes = 0
+        # Fail here rather than on the first frame, in the capture thread
+        _reclaim_stale(name)
+
+        # Counters
+        self.published = 0
+        self.skipped = 0
+
+    def _create(self, nbytes):
+        size = 8 * HEADER_FIELDS + self.slots * (8 * SLOT_FIELDS + nbytes)
+        try:
+            self.shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+        except FileExistsError:
+            # Created since __init__; only replaced if its publisher is gone
+            _reclaim_stale(self.name)
+            self.shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+        _published.add(self.name)
+        self.slot_bytes = nbytes
+        self.header, self.meta, self.meta_f, self.data = _layout(self.shm, self.slots, nbytes)
+        self.meta[:] = 0
+        self.header[:] = 0
+        self.header[H_SLOTS] = self.slots
+        self.header[H_SLOT_BYTES] = nbytes
+        self.header[H_VERSION] = VERSION
+        self.header[H_PID] = os.getpid()
+        # Magic last: clients only attach once the header is complete
+        self.header[H_MAGIC] = MAGIC
+        print(f"[FrameBus] Publishing on '{self.name}': {self.slots} slots of {nbytes / 1e6:.1f} MB")
+
+    def publish(self, seq, capture_time, wall_time, image):
+        """
+        Copy one frame into the next slot. Frames larger than the slots are skipped.
+        """
+        if self.shm is None:
+            self._create(image.nbytes)
+        if image.nbytes > self.slot_bytes:
+            self.skipped += 1
+            return False
+
+        slot = seq % self.slots
+        meta = self.meta[slot]
+        meta[S_BEGIN] = seq
+        self.data[slot, :image.nbytes].reshape(image.shape)[...] = image
+        self.meta_f[slot, S_TIME] = capture_time
+        self.meta_f[slot, S_WALL_TIME] = wall_time
+        meta[S_HEIGHT] = image.shape[0]
+        meta[S_WIDTH] = image.shape[1]
+        meta[S_CHANNELS] = image.shape[2] if image.ndim == 3 else 1
+        meta[S_END] = seq
+        self.header[H_LATEST] = seq
+        self.published += 1
+        return True
+
+    def stats(self):
+        return {"published": self.published, "skipped": self.skipped}
+
+    def close(self):
+        if self.shm is None:
+            return
+        self.header[H_CLOSED] = 1
+        del self.header, self.meta, self.meta_f, self.data
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+        _published.discard(self.name)
+
+
+class FrameBusClient:
+    """
+    Reads frames published by FrameBusPublisher under the same name.
+    Raises FileNotFoundError if nothing is published under that name yet.
+    """
+    def __init__(self, name):
+        self.name = name
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Before Python 3.13 attaching registers the block with the resource
+            # tracker, which would unlink it when this client exits
+            self.shm = shared_memory.SharedMemory(name=name)
+            if name not in _published:
+                resource_tracker.unregister(self.shm._name, "shared_memory")
+        header = np.ndarray((HEADER_FIELDS,), dtype=np.uint64, buffer=self.shm.buf)
+        if header[H_MAGIC] != MAGIC or header[H_VERSION] != VERSION:
+            del header
+            self.shm.close()
+            raise ValueError(f"'{name}' is not a frame bus (or is still being created)")
+        self.slots = int(header[H_SLOTS])
+        self.slot_bytes = int(header[H_SLOT_BYTES])
+        del header
+        self.header, self.meta, self.meta_f, self.data = _layout(self.shm, self.slots, self.slot_bytes)
+
+    @property
+    def closed(self):
+        """
+        True once the publisher has shut down.
+        """
+        return bool(self.header[H_CLOSED])
+
+    def latest_seq(self):
+        return int(self.header[H_LATEST])
+
+    def read(self, seq):
+        """
+        Frame `seq` as a zero-copy view, or None if it is not (or no longer) in the ring.
+        """
+        if seq <= 0:
+            return None
+        slot = seq % self.slots
+        meta = self.meta[slot]
+        if int(meta[S_END]) != seq:
+            return None
+        shape = (int(meta[S_HEIGHT]), int(meta[S_WIDTH]), int(meta[S_CHANNELS]))
+        capture_time = float(self.meta_f[slot, S_TIME])
+        wall_time = float(self.meta_f[slot, S_WALL_TIME])
+        image = self.data[slot, :shape[0] * shape[1] * shape[2]].reshape(shape)
+        image.flags.writeable = False
+        # The writer bumps BEGIN before touching the slot, so a match means the read was clean
+        if int(meta[S_BEGIN]) != seq:
+            return None
+        return BusFrame(seq, capture_time, wall_time, image, slot)
+
+    def latest(self):
+        """
+        The newest complete frame, or None.
+        """
+        return self.read(self.latest_seq())
+
+    def next_after(self, seq, timeout=1.0, poll=0.001):
+        """
+        Wait up to `timeout` seconds for a frame newer than `seq` and return the newest one.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.latest_seq() > seq:
+                frame = self.latest()
+                if frame is not None:
+                    return frame
+            if time.monotonic() >= deadline or self.closed:
+                return None
+            time.sleep(poll)
+
+    def is_current(self, frame):
+        """
+        True while `frame.image` still holds that frame (the publisher hasn't reused its slot).
+        """
+        return int(self.meta[frame.slot, S_BEGIN]) == frame.seq
+
+    def close(self):
+        del self.header, self.meta, self.meta_f, self.data
+        try:
+            self.shm.close()
+        except BufferError:
+            # Frames handed out earlier still reference the mapping; it goes when they do
+            pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Watch a frame bus and report the received frame rate.")
+    parser.add_argument("name", nargs="?", default="labbot_frames", help="Frame bus name")
+    parser.add_argument("--seconds", type=float, default=10.0, help="How long to watch")
+    args = parser.parse_args(argv)
+
+    bus = FrameBusClient(args.name)
+    last_seq = 0
+    received = 0
+    missed = 0
+    torn = 0
+    start = time.monotonic()
+    while time.monotonic() - start < args.seconds:
+        frame = bus.next_after(last_seq, timeout=1.0)
+        if frame is None:
+            if bus.closed:
+                break
+            continue
+        if last_seq:
+            missed += frame.seq - last_seq - 1
+        frame.image.mean()
+        if not bus.is_current(frame):
+            torn += 1
+        last_seq = frame.seq
+        received += 1
+    elapsed = time.monotonic() - start
+    print(f"[FrameBus] {received} frames in {elapsed:.1f}s ({received / elapsed:.1f} fps), "
+          f"{missed} skipped, {torn} overwritten while reading")
+    bus.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,55 @@
+import os
 import tkinter as tk
-from PIL import Image, ImageTk
+import time
+from PIL import ImageTk
 import cv2
 from utils import ImageRecognitionUtils
+from camera import draw_timestamp
+from analysis import AnalysisWorker
+from color_monitor import ColorMonitor
+from motion_gate import MotionGate
+from tracker import ObjectTracker
+from image_writer import ImageWriter
+from recorder import VideoRecorder
+from preview import PreviewRenderer
+from stats import PipelineStats, StatsDumper
+from config import (ANALYSIS_USE_PROCESSES, MOTION_GATE, MOTION_THRESHOLD, MOTION_MAX_AGE,
+                    COLOR_THRESHOLD, COLOR_HYSTERESIS, COLOR_DEBOUNCE_FRAMES, COLOR_SPACE,
+                    COLOR_DOWNSCALE, OUTPUT_DIR, PHOTO_FORMAT, PHOTO_QUALITY, PHOTO_PNG_COMPRESSION,
+                    PHOTO_WORKERS, PHOTO_QUEUE_SIZE, FOOTAGE_DIR, RECORD_CODEC, RECORD_SEGMENT_SECONDS,
+                    RECORD_SEGMENT_MB, RECORD_QUEUE_SIZE, PREVIEW_WIDTH, PREVIEW_FPS,
+                    STATS_WINDOW, STATS_FILE, STATS_FORMAT, STATS_INTERVAL, ROI_LAYOUT_FILE, MODEL_LAZY_LOAD,
+                    TRACKING, TRACK_DETECT_INTERVAL, TRACK_BACKEND, TRACK_IOU_THRESHOLD,
+                    TRACK_MAX_MISSED, TRACK_DWELL_SECONDS)
 
 class ExperimentGUI:
     def __init__(self, camera, logger, roi_manager):
         self.camera = camera
         self.logger = logger
         self.roi_manager = roi_manager
-        self.vision_utils = ImageRecognitionUtils()
+        self.stats = PipelineStats(STATS_WINDOW)
+        # The network is only loaded once object monitoring is first switched on
+        self.vision_utils = ImageRecognitionUtils(lazy=MODEL_LAZY_LOAD)
+        motion_gate = MotionGate(MOTION_THRESHOLD, MOTION_MAX_AGE) if MOTION_GATE and not TRACKING else None
+        tracker = None
+        if TRACKING:
+            tracker = ObjectTracker(self.vision_utils, logger, TRACK_DETECT_INTERVAL, TRACK_IOU_THRESHOLD,
+                                    TRACK_MAX_MISSED, TRACK_DWELL_SECONDS, TRACK_BACKEND)
+        self.analysis = AnalysisWorker(self.vision_utils, use_processes=ANALYSIS_USE_PROCESSES,
+                                       motion_gate=motion_gate, stats=self.stats, tracker=tracker)
+        self.last_result_id = 0
+        self.image_writer = ImageWriter(PHOTO_FORMAT, PHOTO_QUALITY, PHOTO_WORKERS, PHOTO_QUEUE_SIZE,
+                                        PHOTO_PNG_COMPRESSION)
+        self.recorder = None
+
+        # Queue depths and drop counters, polled when stats are read
+        if self.camera.engine is not None:
+            self.stats.register("capture", self.camera.engine.stats)
+        self.stats.register("analysis", self.analysis.stats)
+        self.stats.register("model", self.vision_utils.stats)
+        self.stats.register("photos", self.image_writer.stats)
+        self.stats.register("recorder", lambda: self.recorder.stats() if self.recorder else None)
+        self.stats_dumper = StatsDumper(self.stats, STATS_FILE, STATS_FORMAT, STATS_INTERVAL) if STATS_FILE else None
         self.root = tk.Tk()
         self.root.title("Experiment Monitoring Tool")
 
@@ -40,6 +81,11 @@ class ExperimentGUI:
         self.clear_roi_btn = tk.Button(btn_frame, text="Clear ROI", command=self.clear_roi)
         self.clear_roi_btn.grid(row=0, column=3, padx=5)
 
+        # Show/hide live pipeline stats
+        self.stats_visible = False
+        self.stats_btn = tk.Button(btn_frame, text="Show Stats", command=self.toggle_stats)
+        self.stats_btn.grid(row=0, column=4, padx=5)
+
         # Interval photo capture
         interval_frame = tk.Frame(self.root)
         interval_frame.pack(pady=5)
@@ -52,6 +98,7 @@ class ExperimentGUI:
         
         # Eyedropper for color selection
         self.target_color = None
+        self.color_monitor = None
         self.color_display = tk.Label(btn_frame, text="Selected Color: None", width=30)
         self.color_display.grid(row=1, column=0, padx=5)
 
@@ -67,18 +114,33 @@ class ExperimentGUI:
         self.object_monitoring = False
         self.object_btn = tk.Button(btn_frame, text="Start Object Monitoring", command=self.toggle_object_monitoring)
         self.object_btn.grid(row=1, column=3, padx=5)
+
+        # With tracking, run a full detection now instead of waiting for the interval
+        if self.analysis.tracker is not None:
+            self.detect_btn = tk.Button(btn_frame, text="Detect Now", command=self.detect_now)
+            self.detect_btn.grid(row=1, column=4, padx=5)
         
         # Close program button
         self.close_btn = tk.Button(self.root, text="Close Program", command=self.on_close, bg="red", fg="white")
         self.close_btn.pack(pady=10)
 
+        # Stats panel (packed only while visible)
+        self.stats_label = tk.Label(self.root, font=("Courier", 9), justify="left", anchor="w")
+
         # Flags
         self.running = True
         self.recording = False
-        self.video_writer = None
         self.interval_capture = False
+        self.interval_job = None
         self.color_picking_mode = False
 
+        # Preview state: one RGBA buffer and one PhotoImage, reused every frame
+        self.preview = PreviewRenderer(PREVIEW_WIDTH)
+        self.preview_image = None
+        self.last_render = 0.0
+        # Sequence number of the last frame handled, so a repeated frame isn't analyzed or recorded twice
+        self.last_seq = 0
+
         # ROI drawing state
         self.drawing_roi = False
         self.roi_start = None
@@ -88,46 +150,57 @@ class ExperimentGUI:
         self.update_video()
 
     def take_photo(self):
-        frame, timestamp = self.camera.get_frame()
-        if frame is not None:
-            rois = self.roi_manager.roi_boxes
-            if rois:
+        # Don't steal a frame from the preview loop
+        record = self.camera.get_frame(consume=False)
+        if record is not None:
+            # Photos are saved without overlays; the timestamp is in the filename
+            frame, timestamp = record.image, record.timestamp
+            # Shot number keeps names unique for several photos within one timestamp
+            shot = self.image_writer.next_shot()
+            if len(self.roi_manager):
                 # Save each ROI separately
-                for idx, (start, end) in enumerate(rois, start=1):
-                    x1, y1 = start
-                    x2, y2 = end
-                    x1, x2 = sorted([x1, x2])
-                    y1, y2 = sorted([y1, y2])
-                    cropped = frame[y1:y2, x1:x2]
-                    filename = f"logs/photo_{timestamp}_roi{idx}.jpg"
-                    cv2.imwrite(filename, cropped)
-                    self.logger.log(timestamp, f"ROI {idx} photo captured: {filename}")
-                    print(f"[Photo] Saved ROI {idx}: {filename}")
+                for idx, cropped in enumerate(self.roi_manager.crops(frame), start=1):
+                    filename = self.image_writer.path(OUTPUT_DIR, f"photo_{timestamp}_{shot:04d}_roi{idx}")
+                    self.image_writer.submit(filename, cropped,
+                                             self._photo_saved(timestamp, f"ROI {idx}"))
             else:
                 # Save full frame if no ROI
-                filename = f"logs/photo_{timestamp}.jpg"
-                cv2.imwrite(filename, frame)
-                self.logger.log(timestamp, f"Full-frame photo captured: {filename}")
-                print(f"[Photo] Saved full-frame photo: {filename}")
+                filename = self.image_writer.path(OUTPUT_DIR, f"photo_{timestamp}_{shot:04d}")
+                self.image_writer.submit(filename, frame, self._photo_saved(timestamp, "Full-frame"))
+
+    def _photo_saved(self, timestamp, label):
+        """
+        Completion callback for the image writer; runs on a writer thread.
+        """
+        def on_done(filename, ok):
+            if ok:
+                self.logger.log(timestamp, f"{label} photo captured: {filename}")
+                print(f"[Photo] Saved {label} photo: {filename}")
+            else:
+                self.logger.log(timestamp, f"{label} photo failed: {filename}")
+                print(f"[Photo] Failed to save {label} photo: {filename}")
+        return on_done
 
     def toggle_recording(self):
         if not self.recording:
-            filename = self.filename_entry.get()
-            if not filename.endswith(".avi"):
-                filename += ".avi"
-            fourcc = cv2.VideoWriter_fourcc(*'XVID')
-            self.video_writer = cv2.VideoWriter("footages/"+filename, fourcc, self.camera.frame_rate,
-                                                (int(self.camera.cap.get(3)), int(self.camera.cap.get(4))))
+            # Extension follows the codec; segments are numbered after the name
+            name = os.path.splitext(self.filename_entry.get().strip())[0] or "output"
+            segment_bytes = RECORD_SEGMENT_MB * 1024 * 1024 if RECORD_SEGMENT_MB else None
+            try:
+                self.recorder = VideoRecorder(FOOTAGE_DIR, name, RECORD_CODEC, self.camera.frame_rate,
+                                              RECORD_SEGMENT_SECONDS, segment_bytes, RECORD_QUEUE_SIZE)
+            except (ValueError, OSError) as e:
+                print(f"[Video] Could not start recording: {e}")
+                return
             self.recording = True
             self.record_btn.config(text="Stop Recording")
-            print(f"[Video] Recording started: {filename}")
+            print(f"[Video] Recording started: {name} ({RECORD_CODEC})")
         else:
             self.recording = False
-            if self.video_writer:
-                self.video_writer.release()
-                self.video_writer = None
+            if self.recorder:
+                self.recorder.stop()
+                self.recorder = None
             self.record_btn.config(text="Start Recording")
-            print("[Video] Recording stopped.")
 
     def toggle_interval_capture(self):
         if not self.interval_capture:
@@ -139,39 +212,79 @@ class ExperimentGUI:
                 self.interval_capture = True
                 self.interval_btn.config(text="Stop Interval Capture")
                 print(f"[Timelapse] Interval photo capture started: every {interval} seconds")
-                self.root.after(self.interval_seconds * 1000, self.capture_photo_interval)
+                # Schedule against the monotonic clock so after() jitter doesn't accumulate
+                self.interval_next = time.monotonic() + self.interval_seconds
+                self.schedule_interval_capture()
             except ValueError:
                 print("[System] Please enter a valid positive integer for interval.")
         else:
             self.interval_capture = False
+            if self.interval_job is not None:
+                self.root.after_cancel(self.interval_job)
+                self.interval_job = None
             self.interval_btn.config(text="Start Interval Capture")
             print("[Timelapse] Interval photo capture stopped.")
 
+    def schedule_interval_capture(self):
+        delay = max(0.0, self.interval_next - time.monotonic())
+        self.interval_job = self.root.after(int(delay * 1000), self.capture_photo_interval)
+
     def capture_photo_interval(self):
+        self.interval_job = None
         if self.interval_capture:
             self.take_photo()
-            self.root.after(self.interval_seconds * 1000, self.capture_photo_interval)
+            now = time.monotonic()
+            self.interval_next += self.interval_seconds
+            if self.interval_next <= now:
+                # Fell behind by whole intervals (e.g. window was busy); skip the missed shots
+                missed = int((now - self.interval_next) // self.interval_seconds) + 1
+                self.interval_next += missed * self.interval_seconds
+            self.schedule_interval_capture()
 
     def clear_roi(self):
         self.roi_manager.clear_boxes()
+        self.save_roi_layout()
         print("[System] All ROI boxes cleared.")
 
+    def save_roi_layout(self):
+        if ROI_LAYOUT_FILE:
+            try:
+                self.roi_manager.save(ROI_LAYOUT_FILE)
+            except (IOError, OSError) as e:
+                print(f"[ROI] Could not save ROI layout: {e}")
+
+    def widget_to_frame(self, x, y):
+        """
+        Map a click on the video label to full-resolution frame coordinates,
+        accounting for the preview scale and the image being centered in the label.
+        """
+        if self.preview_image is None or self.preview.frame_size is None:
+            return x, y
+        frame_width, frame_height = self.preview.frame_size
+        offset_x = max(0, (self.video_label.winfo_width() - self.preview_image.width()) // 2)
+        offset_y = max(0, (self.video_label.winfo_height() - self.preview_image.height()) // 2)
+        fx = int((x - offset_x) / self.preview.scale)
+        fy = int((y - offset_y) / self.preview.scale)
+        return max(0, min(frame_width - 1, fx)), max(0, min(frame_height - 1, fy))
+
     def start_draw_roi(self, event):
         self.drawing_roi = True
-        self.roi_start = (event.x, event.y)
+        self.roi_start = self.widget_to_frame(event.x, event.y)
         print(f"[Draw] Start ROI at {self.roi_start}")
 
     def update_draw_roi(self, event):
         if self.drawing_roi:
             self.temp_frame = self.current_frame.copy()
-            cv2.rectangle(self.temp_frame, self.roi_start, (event.x, event.y), (255, 0, 0), 2)
+            cv2.rectangle(self.temp_frame, self.roi_start, self.widget_to_frame(event.x, event.y),
+                          (255, 0, 0), 2)
             self.display_frame(self.temp_frame)
 
     def finish_draw_roi(self, event):
         if self.drawing_roi:
-            roi_end = (event.x, event.y)
-            self.roi_manager.add_box(self.roi_start, roi_end)
-            print(f"[Draw] ROI added: {self.roi_start} to {roi_end}")
+            roi_end = self.widget_to_frame(event.x, event.y)
+            if self.roi_manager.add_box(self.roi_start, roi_end) is not None:
+                self.save_roi_layout()
+                print(f"[Draw] ROI added: {self.roi_start} to {roi_end}")
             self.drawing_roi = False
     def pick_target_color(self):
         """
@@ -193,24 +306,15 @@ class ExperimentGUI:
 
     def get_color_from_click(self, event):
         if self.color_picking_mode and self.paused_frame is not None:
-            # Map click coords from widget to frame coords
-            widget_width = self.video_label.winfo_width()
-            widget_height = self.video_label.winfo_height()
-            frame_height, frame_width = self.paused_frame.shape[:2]
-
-            scale_x = frame_width / widget_width
-            scale_y = frame_height / widget_height
-
-            x = int(event.x * scale_x)
-            y = int(event.y * scale_y)
-
-            # Clamp coordinates
-            x = max(0, min(frame_width - 1, x))
-            y = max(0, min(frame_height - 1, y))
+            # Map click coords from widget to frame coords (clamped)
+            x, y = self.widget_to_frame(event.x, event.y)
 
             # Get BGR color
             bgr_color = self.paused_frame[y, x]
             self.target_color = bgr_color
+            self.color_monitor = ColorMonitor(bgr_color, COLOR_THRESHOLD, COLOR_HYSTERESIS,
+                                              COLOR_DEBOUNCE_FRAMES, COLOR_SPACE, COLOR_DOWNSCALE,
+                                              logger=self.logger)
             print(f"[Colors] Selected Color at ({x}, {y}): BGR={bgr_color}")
 
             # Exit color picking mode
@@ -233,78 +337,130 @@ class ExperimentGUI:
         state = "ON" if self.object_monitoring else "OFF"
         self.object_btn.config(text=f"{'Stop' if self.object_monitoring else 'Start'} Object Monitoring")
         print(f"[Objects] Object monitoring turned {state}.")
+        if self.object_monitoring and not ANALYSIS_USE_PROCESSES:
+            self.vision_utils.preload()
+        stats = self.analysis.stats()
+        if not self.object_monitoring and "skipped" in stats:
+            print(f"[Objects] Inferences run: {stats['inferences']}, skipped (no motion): {stats['skipped']}")
+        model = self.vision_utils.stats()
+        if not self.object_monitoring and model["inferences"]:
+            print(f"[Objects] Model startup {model['load_ms']:.0f} ms + warm-up {model['warmup_ms']:.0f} ms, "
+                  f"{model['mean_inference_ms']:.1f} ms per inference")
+
+    def detect_now(self):
+        self.analysis.tracker.request_detection()
+        print("[Tracks] Full detection requested for the next analyzed frame.")
 
     def update_video(self):
         if self.running and not self.color_picking_mode:
-            frame, timestamp = self.camera.get_frame()
-            if frame is not None:
-                self.current_frame = frame.copy()
-                self.roi_manager.draw_rois(frame)
-
-                # Color monitoring
-                if self.color_monitoring and self.target_color is not None:
-                    for idx, (start, end) in enumerate(self.roi_manager.roi_boxes, start=1):
-                        x1, y1 = start
-                        x2, y2 = end
-                        roi = self.current_frame[y1:y2, x1:x2]
-                        try:
-                            changed, mean_color = self.vision_utils.detect_color_change(roi, self.target_color)
-                            if changed:
-                                print(f"[Colors] ROI {idx}: Color changed! Mean BGR={mean_color}")
-                        except Exception as e:
-                            print(f"[Colors] Color monitoring error: {e}")
-
-
-                # Object monitoring
-                if self.object_monitoring:
-                    for idx, (start, end) in enumerate(self.roi_manager.roi_boxes, start=1):
-                        x1, y1 = start
-                        x2, y2 = end
-                        roi = self.current_frame[y1:y2, x1:x2]
-
-                        try:
-                            detections = self.vision_utils.detect_objects(roi)
-                            if detections:
-                                for det in detections:
-                                    # Bounding box in ROI coordinates
-                                    bx, by, bw, bh = det["box"]
-                                    # Draw box on the main frame (offset by ROI position)
-                                    cv2.rectangle(
-                                        self.current_frame,
-                                        (x1 + bx, y1 + by),
-                                        (x1 + bx + bw, y1 + by + bh),
-                                        (0, 255, 0),
-                                        2
-                                    )
-                                    cv2.putText(
-                                        self.current_frame,
-                                        f"{det['label']} {det['confidence']:.2f}",
-                                        (x1 + bx, y1 + by - 5),
-                                        cv2.FONT_HERSHEY_SIMPLEX,
-                                        0.5,
-                                        (0, 255, 0),
-                                        2
-                                    )
-                                print(f"✅ ROI {idx}: Objects detected -> {[d['label'] for d in detections]}")
-                            else:
-                                print(f"⚠️ ROI {idx}: No object detected!")
-                        except Exception as e:
-                            print(f"⚠️ Object monitoring error: {e}")
-
-                if self.recording and self.video_writer:
-                    self.video_writer.write(frame)
-                self.display_frame(frame)
+            with self.stats.stage("capture"):
+                record = self.camera.get_frame()
+            if record is not None and record.seq != self.last_seq:
+                self.last_seq = record.seq
+                self.stats.tick("frames")
+                # Analysis sees the raw pixels; overlays only go on display/recording copies
+                frame = record.image
+                timestamp = record.timestamp
+                self.current_frame = frame
+                self.roi_manager.set_frame_size(frame.shape[1], frame.shape[0])
+
+                # Color monitoring: one pass over all ROIs, logs only state changes
+                if self.color_monitoring and self.color_monitor is not None:
+                    try:
+                        with self.stats.stage("colors"):
+                            self.color_monitor.update(self.current_frame, self.roi_manager.rect_list,
+                                                      timestamp)
+                    except Exception as e:
+                        print(f"[Colors] Color monitoring error: {e}")
+
+                # Hand the frame to the analysis worker; it drops frames while busy
+                if self.object_monitoring and len(self.roi_manager):
+                    self.analysis.submit(self.current_frame, timestamp, self.roi_manager.rect_list)
+
+                if self.recording and self.recorder:
+                    # The recorder encodes later on its own thread, so give it its own copy
+                    with self.stats.stage("recording"):
+                        recorded = self.overlay(frame, timestamp)
+                        self.recorder.write(recorded, timestamp, record.time)
+
+                # Render at the preview rate, independent of capture and analysis
+                now = time.monotonic()
+                if now - self.last_render >= 1.0 / PREVIEW_FPS:
+                    self.last_render = now
+                    with self.stats.stage("render"):
+                        shown = self.overlay(frame, timestamp)
+                        self.draw_analysis(shown)
+                        self.display_frame(shown)
+                    self.stats.tick("rendered")
         # Schedule next frame only if not in color picking mode
         
         if not self.color_picking_mode:
             self.root.after(int(1000 / self.camera.frame_rate), self.update_video)    
 
+    def overlay(self, frame, timestamp):
+        """
+        Copy of a raw frame with the timestamp and ROIs drawn on it.
+        """
+        annotated = frame.copy()
+        draw_timestamp(annotated, timestamp)
+        self.roi_manager.draw_rois(annotated)
+        return annotated
+
+    def draw_analysis(self, frame):
+        """
+        Overlay the most recent analysis result and its age, without waiting.
+        """
+        result = self.analysis.latest()
+        if result is None or not self.object_monitoring:
+            return
+        fresh = result["id"] != self.last_result_id
+        self.last_result_id = result["id"]
+
+        if result.get("tracks") is not None:
+            # Tracker events are printed and logged by the tracker
+            for track in result["tracks"]:
+                bx, by, bw, bh = track["box"]
+                cv2.rectangle(frame, (bx, by), (bx + bw, by + bh), (0, 255, 0), 2)
+                cv2.putText(frame, f"#{track['id']} {track['label']}", (bx, by - 5),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+        elif result["objects"] is not None:
+            for idx, detections in enumerate(result["objects"], start=1):
+                for det in detections:
+                    bx, by, bw, bh = det["box"]
+                    cv2.rectangle(frame, (bx, by), (bx + bw, by + bh), (0, 255, 0), 2)
+                    cv2.putText(frame, f"{det['label']} {det['confidence']:.2f}", (bx, by - 5),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+                if fresh:
+                    if detections:
+                        print(f"✅ ROI {idx}: Objects detected -> {[d['label'] for d in detections]}")
+                    else:
+                        print(f"⚠️ ROI {idx}: No object detected!")
+
+        age = AnalysisWorker.age(result)
+        cv2.putText(frame, f"Analysis age: {age:.2f}s", (10, 60),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+
     def display_frame(self, frame):
-        img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        img = Image.fromarray(img)
-        imgtk = ImageTk.PhotoImage(image=img)
-        self.video_label.imgtk = imgtk
-        self.video_label.configure(image=imgtk)
+        image, reallocated = self.preview.render(frame)
+        if reallocated or self.preview_image is None:
+            self.preview_image = ImageTk.PhotoImage(image=image)
+            self.video_label.configure(image=self.preview_image)
+        else:
+            self.preview_image.paste(image)
+
+    def toggle_stats(self):
+        self.stats_visible = not self.stats_visible
+        self.stats_btn.config(text="Hide Stats" if self.stats_visible else "Show Stats")
+        if self.stats_visible:
+            self.stats_label.pack(fill="x", padx=10, pady=5)
+            self.update_stats_panel()
+        else:
+            self.stats_label.pack_forget()
+
+    def update_stats_panel(self):
+        if self.stats_visible and self.running:
+            self.stats_label.config(text=self.stats.format_text())
+            self.root.after(1000, self.update_stats_panel)
 
     def start(self):
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
@@ -314,7 +470,12 @@ class ExperimentGUI:
         print("[System] Closing application...")
         self.running = False
         self.interval_capture = False
-        if self.recording and self.video_writer:
-            self.video_writer.release()
+        self.analysis.shutdown()
+        self.image_writer.close()
+        if self.stats_dumper:
+            self.stats_dumper.stop()
+        if self.recording and self.recorder:
+            self.recorder.stop()
         self.camera.release()
+        self.logger.close()
         self.root.destroy()
@@ -0,0 +1,317 @@
+import argparse
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from config import (VIDEO_SOURCE, FRAME_RATE, LOG_FILE,
+                    LOG_FLUSH_SIZE, LOG_FLUSH_INTERVAL, LOG_MAX_BYTES, LOG_ROTATE_DAILY,
+                    COLOR_THRESHOLD, COLOR_HYSTERESIS, COLOR_DEBOUNCE_FRAMES, COLOR_SPACE,
+                    COLOR_DOWNSCALE, MOTION_GATE, MOTION_THRESHOLD, MOTION_MAX_AGE,
+                    STATS_WINDOW, STATS_FILE, STATS_FORMAT, STATS_INTERVAL,
+                    TRACKING, TRACK_DETECT_INTERVAL, TRACK_BACKEND, TRACK_IOU_THRESHOLD, TRACK_MAX_MISSED,
+                    TRACK_DWELL_SECONDS, FRAME_BUS, FRAME_BUS_SLOTS)
+from camera import Camera
+from logger import Logger
+from roi_manager import ROIManager
+from utils import ImageRecognitionUtils
+from analysis import analyze_frame
+from color_monitor import ColorMonitor
+from motion_gate import MotionGate
+from tracker import ObjectTracker
+from stats import PipelineStats, StatsDumper
+
+
+class HeadlessMonitor:
+    """
+    Runs color/object monitoring without a Tk display and keeps per-stage timings.
+    """
+    def __init__(self, camera, logger, roi_manager, vision_utils=None, target_color=None,
+                 color_monitoring=False, object_monitoring=False, realtime=False, max_frames=None,
+                 stats_file=None, stats_format="prometheus", tracking=False,
+                 detect_interval=TRACK_DETECT_INTERVAL):
+        self.camera = camera
+        self.logger = logger
+        self.roi_manager = roi_manager
+        self.vision_utils = vision_utils or ImageRecognitionUtils(lazy=True)
+        if object_monitoring:
+            # Load up front so startup cost isn't counted as frame time
+            self.vision_utils.load()
+        self.target_color = target_color
+        self.color_monitoring = color_monitoring and target_color is not None
+        self.color_monitor = None
+        if self.color_monitoring:
+            self.color_monitor = ColorMonitor(target_color, COLOR_THRESHOLD, COLOR_HYSTERESIS,
+                                              COLOR_DEBOUNCE_FRAMES, COLOR_SPACE, COLOR_DOWNSCALE,
+                                              logger=logger)
+        self.object_monitoring = object_monitoring
+        self.motion_gate = MotionGate(MOTION_THRESHOLD, MOTION_MAX_AGE) if MOTION_GATE else None
+        self.tracker = None
+        if object_monitoring and tracking:
+            # The tracker decides when to detect, so the motion gate is not used
+            self.tracker = ObjectTracker(self.vision_utils, logger, detect_interval, TRACK_IOU_THRESHOLD,
+                                         TRACK_MAX_MISSED, TRACK_DWELL_SECONDS, TRACK_BACKEND)
+            self.motion_gate = None
+        self.realtime = realtime
+        self.max_frames = max_frames
+
+        self.frames = 0
+        self.elapsed = 0.0
+        self.stage_times = {"capture": 0.0, "colors": 0.0, "objects": 0.0, "logging": 0.0}
+        self.stats = PipelineStats(STATS_WINDOW)
+        self.stats_file = stats_file
+        self.stats_format = stats_format
+        if self.motion_gate is not None:
+            self.stats.register("motion_gate", self.motion_gate.stats)
+        if self.tracker is not None:
+            self.stats.register("tracker", self.tracker.stats)
+
+        # Last reported objects per ROI, so only changes are logged
+        self.object_state = {}
+
+    def run(self):
+        objects = "ON" if self.object_monitoring else "OFF"
+        if self.tracker is not None:
+            objects += f" (tracking, detect every {self.tracker.detect_interval} frames)"
+        print(f"[Headless] Monitoring {len(self.roi_manager)} ROI(s): "
+              f"colors={'ON' if self.color_monitoring else 'OFF'}, objects={objects}")
+        period = 1.0 / self.camera.frame_rate
+        dumper = None
+        if self.stats_file:
+            dumper = StatsDumper(self.stats, self.stats_file, self.stats_format, STATS_INTERVAL)
+        start = time.perf_counter()
+        next_tick = time.monotonic()
+        try:
+            while self.max_frames is None or self.frames < self.max_frames:
+                with self.timed("capture"):
+                    record = self.camera.get_frame()
+                if record is None:
+                    break
+                self.process(record.image, record.timestamp, record.time)
+                self.frames += 1
+                self.stats.tick("frames")
+
+                if self.realtime:
+                    next_tick += period
+                    delay = next_tick - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+        except KeyboardInterrupt:
+            print("[Headless] Interrupted.")
+        self.elapsed = time.perf_counter() - start
+        if dumper is not None:
+            dumper.stop()
+        self.print_summary()
+
+    @contextmanager
+    def timed(self, stage):
+        """
+        Time a stage into both the run totals and the rolling PipelineStats.
+        """
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            self.stage_times[stage] += elapsed
+            self.stats.record(stage, elapsed)
+
+    def process(self, frame, timestamp, now=None):
+        """
+        Analyze one frame. `now` is its capture time in seconds (default: now),
+        which color and track durations are measured with.
+        """
+        self.roi_manager.set_frame_size(frame.shape[1], frame.shape[0])
+        rects = self.roi_manager.rect_list
+        if not rects:
+            return
+
+        if self.color_monitoring:
+            # Transition events are logged by the monitor itself
+            with self.timed("colors"):
+                self.color_monitor.update(frame, rects, timestamp, now)
+
+        if self.tracker is not None:
+            # Enter/exit/dwell events are logged by the tracker itself
+            with self.timed("objects"):
+                self.tracker.update(frame, rects, timestamp, now)
+        elif self.object_monitoring:
+            with self.timed("objects"):
+                objects = analyze_frame(self.vision_utils, frame, rects, self.motion_gate)["objects"]
+
+            with self.timed("logging"):
+                for idx, detections in enumerate(objects, start=1):
+                    labels = sorted(d["label"] for d in detections)
+                    if self.object_state.get(idx) != labels:
+                        self.object_state[idx] = labels
+                        self.logger.log(timestamp, f"ROI {idx} objects: {labels if labels else 'none'}")
+
+    def summary(self):
+        fps = self.frames / self.elapsed if self.elapsed > 0 else 0.0
+        per_frame = {stage: (total / self.frames * 1000 if self.frames else 0.0)
+                     for stage, total in self.stage_times.items()}
+        latency = {stage: s["p99_ms"] for stage, s in self.stats.snapshot()["stages"].items()}
+        summary = {"frames": self.frames, "elapsed_s": self.elapsed, "fps": fps, "stage_ms": per_frame,
+                   "stage_p99_ms": latency}
+        if self.object_monitoring and self.motion_gate is not None:
+            summary["motion_gate"] = self.motion_gate.stats()
+        if self.tracker is not None:
+            summary["tracker"] = self.tracker.stats()
+        if self.object_monitoring:
+            summary["model"] = self.vision_utils.stats()
+        return summary
+
+    def print_summary(self):
+        summary = self.summary()
+        print(f"[Headless] {summary['frames']} frames in {summary['elapsed_s']:.2f}s "
+              f"({summary['fps']:.1f} fps)")
+        for stage, ms in summary["stage_ms"].items():
+            p99 = summary["stage_p99_ms"].get(stage)
+            p99_text = f"  (p99 {p99:.2f} ms, last {STATS_WINDOW} frames)" if p99 is not None else ""
+            print(f"[Headless]   {stage:<8} {ms:8.2f} ms/frame{p99_text}")
+        if "motion_gate" in summary:
+            gate = summary["motion_gate"]
+            print(f"[Headless] Inferences run: {gate['inferences']}, skipped (no motion): "
+                  f"{gate['skipped']} ({gate['skip_ratio']:.0%})")
+        if summary.get("model", {}).get("loaded"):
+            model = summary["model"]
+            if model["load_ms"] is not None:
+                print(f"[Headless] Model startup {model['load_ms']:.0f} ms (warm-up {model['warmup_ms']:.0f} ms), "
+                      f"{model['mean_inference_ms']:.1f} ms per inference over {model['inferences']} inferences")
+        if "tracker" in summary:
+            tracker = summary["tracker"]
+            print(f"[Headless] Detections run: {tracker['detections_run']} of {tracker['frames']} frames "
+                  f"({tracker['detect_ratio']:.0%}), {tracker['active_tracks']} track(s) active")
+
+
+def parse_source(value):
+    """
+    Device indices come in as strings from the CLI; anything else is a file path or URL.
+    """
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return value
+
+
+def parse_ints(value):
+    return [int(v) for v in value.split(",")]
+
+
+def parse_start(value):
+    return datetime.strptime(value, "%Y-%m-%d_%H-%M-%S")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Run experiment monitoring without a GUI.")
+    parser.add_argument("--config", help="JSON file with source, rois, target_color and monitoring modes")
+    parser.add_argument("--source", help="Device index or video file path (default: VIDEO_SOURCE)")
+    parser.add_argument("--roi", action="append", type=parse_ints, metavar="X1,Y1,X2,Y2",
+                        help="ROI rectangle; repeat for several ROIs")
+    parser.add_argument("--rois-file", help="ROI layout JSON saved by the GUI (added before --roi boxes)")
+    parser.add_argument("--target-color", type=parse_ints, metavar="B,G,R",
+                        help="Target color for color monitoring")
+    parser.add_argument("--colors", action="store_true", default=None, help="Enable color monitoring")
+    parser.add_argument("--objects", action="store_true", default=None, help="Enable object monitoring")
+    parser.add_argument("--track", action="store_true", default=None,
+                        help="Detect every --detect-interval frames and track objects in between")
+    parser.add_argument("--detect-interval", type=int, help="Frames between full detections when tracking")
+    parser.add_argument("--frame-rate", type=float, help="Frame rate used with --realtime")
+    parser.add_argument("--realtime", action="store_true", default=None,
+                        help="Pace processing at the frame rate instead of as fast as possible")
+    parser.add_argument("--start", metavar="YYYY-MM-DD_HH-MM-SS",
+                        help="Recording start of a video file source, for event timestamps "
+                             "(default: file modification time minus its duration)")
+    parser.add_argument("--max-frames", type=int, help="Stop after this many frames")
+    parser.add_argument("--frame-bus", metavar="NAME",
+                        help="Publish frames to shared memory under NAME for other processes")
+    parser.add_argument("--log-file", help="CSV event log (default: LOG_FILE)")
+    parser.add_argument("--stats-file", help="Periodic pipeline stats dump (default: STATS_FILE)")
+    parser.add_argument("--stats-format", choices=["prometheus", "csv"], help="Stats file format")
+    return parser
+
+
+def load_settings(args):
+    """
+    Merge config file settings with CLI flags; flags win.
+    """
+    settings = {
+        "source": VIDEO_SOURCE,
+        "rois": [],
+        "rois_file": None,
+        "target_color": None,
+        "colors": False,
+        "objects": False,
+        "track": TRACKING,
+        "detect_interval": TRACK_DETECT_INTERVAL,
+        "frame_rate": FRAME_RATE,
+        "realtime": False,
+        "start": None,
+        "max_frames": None,
+        "log_file": LOG_FILE,
+        "frame_bus": FRAME_BUS,
+        "stats_file": STATS_FILE,
+        "stats_format": STATS_FORMAT,
+    }
+    if args.config:
+        with open(args.config, "r") as f:
+            settings.update(json.load(f))
+
+    for key in ("source", "rois_file", "target_color", "colors", "objects", "track", "detect_interval", "frame_rate",
+                "realtime", "start", "max_frames", "log_file", "frame_bus", "stats_file", "stats_format"):
+        value = getattr(args, key)
+        if value is not None:
+            settings[key] = value
+    if args.roi:
+        settings["rois"] = args.roi
+
+    settings["source"] = parse_source(settings["source"])
+    return settings
+
+
+def main(argv=None):
+    settings = load_settings(build_parser().parse_args(argv))
+
+    cam = Camera(settings["source"], settings["frame_rate"], frame_bus=settings["frame_bus"],
+                 frame_bus_slots=FRAME_BUS_SLOTS)
+    logger = Logger(settings["log_file"], LOG_FLUSH_SIZE, LOG_FLUSH_INTERVAL, LOG_MAX_BYTES, LOG_ROTATE_DAILY)
+    if not cam.cap.isOpened():
+        print(f"[Headless] Could not open video source: {settings['source']}")
+        logger.close()
+        return
+
+    source = settings["source"]
+    if isinstance(source, str) and os.path.isfile(source) and not settings["realtime"]:
+        # Replaying footage faster than real time: stamp events with the footage's own clock
+        if settings["start"]:
+            start = parse_start(settings["start"])
+        else:
+            start = datetime.fromtimestamp(os.path.getmtime(source)) - timedelta(seconds=cam.footage_duration())
+        cam.use_footage_clock(start)
+        print(f"[Headless] Timing {source} from {start:%Y-%m-%d %H:%M:%S} at the file's frame rate")
+
+    roi_manager = ROIManager()
+    if settings["rois_file"]:
+        # Scale the layout to this camera first: --roi boxes are in its pixels
+        roi_manager.load(settings["rois_file"], cam.frame_size())
+    for x1, y1, x2, y2 in settings["rois"]:
+        roi_manager.add_box((x1, y1), (x2, y2))
+
+    monitor = HeadlessMonitor(cam, logger, roi_manager,
+                              target_color=settings["target_color"],
+                              color_monitoring=settings["colors"],
+                              object_monitoring=settings["objects"],
+                              realtime=settings["realtime"],
+                              max_frames=settings["max_frames"],
+                              stats_file=settings["stats_file"],
+                              stats_format=settings["stats_format"],
+                              tracking=settings["track"],
+                              detect_interval=settings["detect_interval"])
+    try:
+        monitor.run()
+    finally:
+        cam.release()
+        logger.close()
+
+
+if __name__ == "__main__":
+    main()
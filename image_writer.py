@@ -0,0 +1,120 @@
+import os
+import queue
+import threading
+import cv2
+
+# File extension per supported format
+FORMAT_EXTENSIONS = {"jpg": ".jpg", "jpeg": ".jpg", "png": ".png", "webp": ".webp"}
+
+
+def encode_params(fmt, quality, png_compression=3):
+    """
+    cv2.imwrite parameters for a format. `quality` is 0-100 for JPEG and 1-100
+    for WebP (101 means lossless); PNG uses `png_compression`, a 0-9 level.
+    Out-of-range values raise ValueError instead of being clamped by OpenCV.
+    """
+    quality = int(quality)
+    if fmt in ("jpg", "jpeg"):
+        if not 0 <= quality <= 100:
+            raise ValueError(f"JPEG quality must be 0-100, got {quality}")
+        return [cv2.IMWRITE_JPEG_QUALITY, quality]
+    if fmt == "png":
+        png_compression = int(png_compression)
+        if not 0 <= png_compression <= 9:
+            raise ValueError(f"PNG compression must be 0-9, got {png_compression}")
+        return [cv2.IMWRITE_PNG_COMPRESSION, png_compression]
+    if fmt == "webp":
+        if not 1 <= quality <= 101:
+            raise ValueError(f"WebP quality must be 1-100 (101 = lossless), got {quality}")
+        return [cv2.IMWRITE_WEBP_QUALITY, quality]
+    raise ValueError(f"Unsupported image format: {fmt}")
+
+
+class ImageWriter:
+    """
+    Encodes and writes images on a pool of worker threads fed by a bounded queue.
+    submit() never blocks: when the queue is full (disk can't keep up) the image
+    is rejected and counted, so callers can see the back-pressure.
+    """
+    def __init__(self, fmt="jpg", quality=95, workers=2, queue_size=32, png_compression=3):
+        self.fmt = fmt.lower()
+        self.extension = FORMAT_EXTENSIONS.get(self.fmt)
+        if self.extension is None:
+            raise ValueError(f"Unsupported image format: {fmt}")
+        self.params = encode_params(self.fmt, quality, png_compression)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        self.shot = 0
+
+        # Counters
+        self.written = 0
+        self.failed = 0
+        self.rejected = 0
+
+        self.threads = [threading.Thread(target=self._run, name=f"ImageWriter-{i}", daemon=True)
+                        for i in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def next_shot(self):
+        """
+        Session-wide shot number, so several shots within one timestamp get unique names.
+        """
+        with self.lock:
+            self.shot += 1
+            return self.shot
+
+    def path(self, directory, stem):
+        return os.path.join(directory, stem + self.extension)
+
+    def submit(self, path, image, on_done=None):
+        """
+        Queue `image` to be written to `path`. Returns False if the queue is full.
+        `on_done(path, ok)` is called from a worker thread once the write finished.
+        """
+        try:
+            self.queue.put_nowait((path, image, on_done))
+            return True
+        except queue.Full:
+            with self.lock:
+                self.rejected += 1
+            print(f"[Photo] Writer queue full, dropped {path}")
+            return False
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            path, image, on_done = job
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                ok = cv2.imwrite(path, image, self.params)
+            except Exception as e:
+                print(f"[Photo] Failed to write {path}: {e}")
+                ok = False
+            with self.lock:
+                if ok:
+                    self.written += 1
+                else:
+                    self.failed += 1
+            if on_done is not None:
+                on_done(path, ok)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "queued": self.queue.qsize(),
+                "written": self.written,
+                "failed": self.failed,
+                "rejected": self.rejected,
+            }
+
+    def close(self):
+        """
+        Write everything still queued, then stop the workers.
+        """
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
@@ -1,19 +1,140 @@
 import csv
 import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+
+def format_timestamp(wall_time):
+    """
+    Log timestamp for a time.time() value, with millisecond precision, e.g. 2024-05-01_13-45-07.123
+    """
+    return datetime.fromtimestamp(wall_time).strftime("%Y-%m-%d_%H-%M-%S.%f")[:-3]
+
+
+def now_timestamp():
+    """
+    Wall-clock timestamp with millisecond precision, e.g. 2024-05-01_13-45-07.123
+    """
+    return format_timestamp(time.time())
+
 
 class Logger:
-    def __init__(self, file_path):
+    """
+    CSV event logger. Records are queued and written by a background thread
+    through one persistent file handle, flushed every `flush_size` records or
+    `flush_interval` seconds, and rotated by size and/or date.
+    Call close() to guarantee the final flush.
+    """
+    def __init__(self, file_path, flush_size=100, flush_interval=1.0,
+                 max_bytes=10 * 1024 * 1024, rotate_daily=False):
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
         self.file_path = file_path
-        if not os.path.exists(file_path):
-            with open(self.file_path, "w", newline="") as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerow(["Timestamp", "Event"])
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
 
-    def log(self, timestamp, event):
+        self.csvfile = None
+        self.writer = None
+        self.opened_on = None
+        # Monotonic time before which a failed size rotation isn't retried
+        self.rotate_after = 0.0
+        self._open()
+
+        self.queue = queue.Queue()
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name="Logger", daemon=True)
+        self.thread.start()
+
+    def _open(self):
+        new_file = not os.path.exists(self.file_path) or os.path.getsize(self.file_path) == 0
+        self.csvfile = open(self.file_path, "a", newline="")
+        self.writer = csv.writer(self.csvfile)
+        self.opened_on = datetime.now().date()
+        if new_file:
+            self.writer.writerow(["Timestamp", "Event"])
+            self.csvfile.flush()
+
+    def _rotate(self):
+        self.csvfile.close()
+        stem, ext = os.path.splitext(self.file_path)
+        rotated = f"{stem}_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}{ext}"
+        suffix = 1
+        while os.path.exists(rotated):
+            rotated = f"{stem}_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}_{suffix}{ext}"
+            suffix += 1
         try:
-            with open(self.file_path, "a", newline="") as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerow([timestamp, event])
-        except IOError as e:
-            print(f"Logger error: {e}")
+            os.replace(self.file_path, rotated)
+            print(f"[Logger] Rotated log to {rotated}")
+        except OSError as e:
+            # E.g. the file is open in another program on Windows: keep appending, retry later
+            print(f"Logger error: could not rotate log, retrying in a minute: {e}")
+            self.rotate_after = time.monotonic() + 60
+        finally:
+            self._open()
+
+    def _needs_rotation(self):
+        if self.rotate_daily and datetime.now().date() != self.opened_on:
+            return True
+        if self.max_bytes is None or time.monotonic() < self.rotate_after:
+            return False
+        return self.csvfile.tell() >= self.max_bytes
+
+    def _write(self, rows):
+        try:
+            if self.csvfile.closed:
+                # A previous reopen failed
+                self._open()
+            if self._needs_rotation():
+                self._rotate()
+            self.writer.writerows(rows)
+            self.csvfile.flush()
+        except Exception as e:
+            # Never let the writer thread die: log() would queue into nothing
+            print(f"Logger error: {e}, {len(rows)} event(s) not written")
+
+    def _run(self):
+        rows = []
+        last_flush = time.monotonic()
+        while True:
+            timeout = max(0.0, self.flush_interval - (time.monotonic() - last_flush))
+            try:
+                record = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                record = ()
+            if record is None:
+                break
+            if record:
+                rows.append(record)
+            if len(rows) >= self.flush_size or time.monotonic() - last_flush >= self.flush_interval:
+                if rows:
+                    self._write(rows)
+                    rows = []
+                last_flush = time.monotonic()
+
+        if rows:
+            self._write(rows)
+        self.csvfile.close()
+
+    def log(self, timestamp, event):
+        """
+        Queue an event. Pass timestamp=None to stamp it with the current time.
+        """
+        if self.closed:
+            print(f"Logger error: log is closed, dropped event: {event}")
+            return
+        if timestamp is None:
+            timestamp = now_timestamp()
+        self.queue.put((timestamp, event))
+
+    def close(self):
+        """
+        Flush everything queued so far and close the file.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
@@ -1,13 +1,20 @@
-from config import VIDEO_SOURCE, FRAME_RATE, LOG_FILE
+import os
+from config import (VIDEO_SOURCE, FRAME_RATE, LOG_FILE, CAPTURE_THREADED, CAPTURE_BUFFER_SIZE,
+                    LOG_FLUSH_SIZE, LOG_FLUSH_INTERVAL, LOG_MAX_BYTES, LOG_ROTATE_DAILY, ROI_LAYOUT_FILE,
+                    FRAME_BUS, FRAME_BUS_SLOTS)
 from camera import Camera
 from logger import Logger
 from roi_manager import ROIManager
 from gui import ExperimentGUI
 
 def main():
-    cam = Camera(VIDEO_SOURCE, FRAME_RATE)
-    logger = Logger(LOG_FILE)
+    cam = Camera(VIDEO_SOURCE, FRAME_RATE, threaded=CAPTURE_THREADED, buffer_size=CAPTURE_BUFFER_SIZE,
+                 frame_bus=FRAME_BUS, frame_bus_slots=FRAME_BUS_SLOTS)
+    logger = Logger(LOG_FILE, LOG_FLUSH_SIZE, LOG_FLUSH_INTERVAL, LOG_MAX_BYTES, LOG_ROTATE_DAILY)
     roi_manager = ROIManager()
+    if ROI_LAYOUT_FILE and os.path.exists(ROI_LAYOUT_FILE):
+        roi_manager.load(ROI_LAYOUT_FILE, cam.frame_size())
+        print(f"[System] Loaded {len(roi_manager)} ROI(s) from {ROI_LAYOUT_FILE}")
 
     # # Example ROI
     # roi_manager.add_box((100, 100), (300, 300))
@@ -0,0 +1,85 @@
+import time
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Decides per ROI whether object detection needs to run again.
+    Each ROI keeps a small grayscale fingerprint of the crop it was last
+    detected on. Detection re-runs when the mean absolute difference to that
+    fingerprint exceeds `threshold` (0-255), when the cached result is older
+    than `max_age` seconds, or when the ROI rectangle changed. Otherwise the
+    cached detections are reused.
+    """
+    def __init__(self, threshold=8.0, max_age=30.0, size=32):
+        self.threshold = threshold
+        self.max_age = max_age
+        self.size = size
+        self.cache = {}
+
+        # Counters
+        self.inferences = 0
+        self.skipped = 0
+
+    def fingerprint(self, roi):
+        gray = roi if roi.ndim == 2 else cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(gray, (self.size, self.size), interpolation=cv2.INTER_AREA)
+
+    def run(self, rois, rects, detect_fn, now=None):
+        """
+        Return one list of detections per ROI. `detect_fn(indices)` is called
+        once with the indices of the ROIs that need fresh detection and must
+        return their detections in the same order.
+        """
+        now = time.monotonic() if now is None else now
+        stale, prints = self.select(rois, rects, now)
+        fresh = detect_fn(stale) if stale else []
+        return self.store(stale, prints, rects, fresh, now)
+
+    def select(self, rois, rects, now=None):
+        """
+        First half of run(): return (indices of ROIs needing detection, fingerprints).
+        """
+        now = time.monotonic() if now is None else now
+        if len(self.cache) > len(rois):
+            self.cache = {i: entry for i, entry in self.cache.items() if i < len(rois)}
+
+        stale = []
+        prints = {}
+        for i, (roi, rect) in enumerate(zip(rois, rects)):
+            if roi.size == 0:
+                self.cache.pop(i, None)
+                continue
+            prints[i] = self.fingerprint(roi)
+            entry = self.cache.get(i)
+            if (entry is None or entry["rect"] != rect
+                    or now - entry["time"] > self.max_age
+                    or float(np.mean(cv2.absdiff(prints[i], entry["fingerprint"]))) > self.threshold):
+                stale.append(i)
+        return stale, prints
+
+    def store(self, stale, prints, rects, fresh, now=None):
+        """
+        Second half of run(): cache `fresh` detections for the `stale` ROIs and
+        return the detections for every ROI.
+        """
+        now = time.monotonic() if now is None else now
+        for i, detections in zip(stale, fresh):
+            self.cache[i] = {"rect": rects[i], "fingerprint": prints[i],
+                             "detections": detections, "time": now}
+
+        self.inferences += len(stale)
+        self.skipped += len(prints) - len(stale)
+        return [self.cache[i]["detections"] if i in self.cache else [] for i in range(len(rects))]
+
+    def reset(self):
+        self.cache = {}
+
+    def stats(self):
+        total = self.inferences + self.skipped
+        return {
+            "inferences": self.inferences,
+            "skipped": self.skipped,
+            "skip_ratio": self.skipped / total if total else 0.0,
+        }
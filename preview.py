@@ -0,0 +1,42 @@
+import cv2
+import numpy as np
+from PIL import Image
+
+
+class PreviewRenderer:
+    """
+    Converts BGR frames into a preview-sized PIL image without per-frame allocations.
+    The returned image shares memory with an RGBA buffer that is reused every frame
+    (PIL only shares 4-byte pixel modes), so callers must paste/copy it before the
+    next render.
+    """
+    def __init__(self, preview_width=None):
+        self.preview_width = preview_width
+        self.rgba = None
+        self.resized = None
+        self.image = None
+        self.scale = 1.0
+        self.frame_size = None
+
+    def render(self, frame):
+        """
+        Render `frame` and return (image, reallocated). `reallocated` is True when
+        the preview size changed and a new image object was created.
+        """
+        frame_height, frame_width = frame.shape[:2]
+        self.frame_size = (frame_width, frame_height)
+        scale = min(1.0, self.preview_width / frame_width) if self.preview_width else 1.0
+        size = (max(1, int(frame_width * scale)), max(1, int(frame_height * scale)))
+        self.scale = size[0] / frame_width
+
+        reallocated = self.rgba is None or self.rgba.shape[1::-1] != size
+        if reallocated:
+            self.rgba = np.empty((size[1], size[0], 4), dtype=np.uint8)
+            self.resized = np.empty((size[1], size[0], 3), dtype=np.uint8) if scale < 1.0 else None
+            self.image = Image.frombuffer("RGBA", size, self.rgba, "raw", "RGBA", 0, 1)
+
+        if self.resized is not None:
+            cv2.resize(frame, size, dst=self.resized, interpolation=cv2.INTER_AREA)
+            frame = self.resized
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA, dst=self.rgba)
+        return self.image, reallocated
@@ -0,0 +1,328 @@
+import argparse
+import csv
+import os
+import time
+from datetime import datetime, timedelta
+from multiprocessing import Pool
+import cv2
+import numpy as np
+from config import (OUTPUT_DIR, FRAME_RATE, LOG_FLUSH_SIZE, LOG_FLUSH_INTERVAL,
+                    COLOR_THRESHOLD, COLOR_HYSTERESIS, COLOR_DEBOUNCE_FRAMES, COLOR_SPACE,
+                    COLOR_DOWNSCALE, MOTION_GATE, MOTION_THRESHOLD, MOTION_MAX_AGE)
+from logger import Logger, format_timestamp
+from roi_manager import ROIManager
+from utils import ImageRecognitionUtils
+from color_monitor import ColorMonitor
+from motion_gate import MotionGate
+from headless import parse_ints, parse_start
+
+# Per-process state for the worker pool
+_worker_utils = None
+_worker_monitor = None
+
+
+def load_footage(paths, fps=None, start=None):
+    """
+    Describe the footage to analyze as a list of segments, in playback order.
+    `paths` is either one recording index CSV (written by VideoRecorder), whose
+    segments and per-frame timestamps are used as-is, or one or more video files
+    played back to back, timed from `start` (default: first file's modification
+    time minus its duration) at `fps` (default: the file's frame rate).
+    """
+    if len(paths) == 1 and paths[0].lower().endswith(".csv"):
+        return _load_index(paths[0])
+
+    segments = []
+    offset = 0.0
+    for path in paths:
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            raise IOError(f"Could not open video: {path}")
+        frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        rate = fps or cap.get(cv2.CAP_PROP_FPS) or FRAME_RATE
+        size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        cap.release()
+        if start is None:
+            start = datetime.fromtimestamp(os.path.getmtime(path)) - timedelta(seconds=frames / rate)
+        segments.append({"path": path, "frames": frames, "fps": rate, "offset": offset,
+                         "start": start, "size": size, "timestamps": None, "times": None})
+        offset += frames / rate
+    return segments
+
+
+def _load_index(index_path):
+    directory = os.path.dirname(index_path)
+    segments = {}
+    with open(index_path, "r", newline="") as f:
+        for row in csv.DictReader(f):
+            seg = segments.setdefault(row["File"], {"path": os.path.join(directory, row["File"]),
+                                                    "timestamps": [], "times": []})
+            seg["timestamps"].append(row["Timestamp"])
+            seg["times"].append(float(row["CaptureTime"]))
+    result = []
+    for seg in segments.values():
+        cap = cv2.VideoCapture(seg["path"])
+        if not cap.isOpened():
+            raise IOError(f"Could not open video: {seg['path']}")
+        seg["size"] = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        seg["fps"] = cap.get(cv2.CAP_PROP_FPS) or FRAME_RATE
+        cap.release()
+        seg["frames"] = len(seg["timestamps"])
+        result.append(seg)
+    return result
+
+
+def frame_time(segment, frame):
+    """
+    (log timestamp, seconds on the recording's clock) of one frame of a segment.
+    """
+    if segment["timestamps"] is not None:
+        return segment["timestamps"][frame], segment["times"][frame]
+    seconds = segment["offset"] + frame / segment["fps"]
+    return format_timestamp((segment["start"] + timedelta(seconds=seconds)).timestamp()), seconds
+
+
+def seeks_exactly(path, frame):
+    """
+    True if seeking `path` to `frame` reports landing on it. Files where it
+    doesn't would be decoded from the start for every chunk.
+    """
+    cap = cv2.VideoCapture(path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, frame)
+    exact = int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == frame
+    cap.release()
+    return exact
+
+
+def plan_chunks(segments, chunk_frames, sequential=()):
+    """
+    Split every segment into frame ranges. Segment files start on a keyframe,
+    so chunks never span two files. Segments listed in `sequential` (by index)
+    become a single chunk.
+    """
+    chunks = []
+    for index, seg in enumerate(segments):
+        step = max(seg["frames"], 1) if index in sequential else chunk_frames
+        for start in range(0, max(seg["frames"], 1), step):
+            chunks.append({"segment": index, "path": seg["path"], "start": start,
+                           "end": min(start + step, seg["frames"]), "fps": seg["fps"]})
+    return chunks
+
+
+def _init_worker(color_settings, objects):
+    global _worker_utils, _worker_monitor
+    # One process per core already; OpenCV's own threads would only compete
+    cv2.setNumThreads(1)
+    if color_settings is not None:
+        color_space, downscale = color_settings
+        _worker_monitor = ColorMonitor((0, 0, 0), color_space=color_space, downscale=downscale)
+    if objects:
+        _worker_utils = ImageRecognitionUtils()
+
+
+def _open_at(path, frame):
+    """
+    Open a video so the next read() returns `frame`. Seeking lands on a keyframe
+    and not every backend decodes forward from it, so the position is read back
+    and any remaining frames are grabbed; if it can't be trusted, the file is
+    decoded from the start. Returns (capture, how it got there).
+    """
+    cap = cv2.VideoCapture(path)
+    if frame == 0:
+        return cap, "start"
+    cap.set(cv2.CAP_PROP_POS_FRAMES, frame)
+    position = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+    if position == frame:
+        return cap, "seek"
+    method = "keyframe"
+    if not 0 < position < frame:
+        cap.release()
+        cap = cv2.VideoCapture(path)
+        position = 0
+        method = "rewind"
+    for _ in range(frame - position):
+        if not cap.grab():
+            break
+    return cap, method
+
+
+def _analyze_chunk(task):
+    """
+    Decode one frame range and measure it. Returns ROI color means per frame and
+    the sorted object labels per ROI every `object_stride` frames. Turning these
+    into events is left to the parent, so state carries across chunk borders.
+    """
+    chunk, rects, object_stride = task
+    cap, seek = _open_at(chunk["path"], chunk["start"])
+    gate = MotionGate(MOTION_THRESHOLD, MOTION_MAX_AGE) if MOTION_GATE and _worker_utils else None
+    offsets = [(x1, y1) for x1, y1, _, _ in rects]
+
+    means = []
+    objects = []
+    frame_index = chunk["start"]
+    while frame_index < chunk["end"]:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        if _worker_monitor is not None:
+            means.append(_worker_monitor.means(frame, rects))
+        if _worker_utils is not None and (frame_index - chunk["start"]) % object_stride == 0:
+            rois = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in rects]
+            if gate is None:
+                detections = _worker_utils.detect_objects_batch(rois, offsets)
+            else:
+                now = frame_index / chunk["fps"]
+                detections = gate.run(rois, rects, lambda indices: _worker_utils.detect_objects_batch(
+                    [rois[i] for i in indices], [offsets[i] for i in indices]), now)
+            objects.append((frame_index, [sorted(d["label"] for d in dets) for dets in detections]))
+        frame_index += 1
+    cap.release()
+
+    return {
+        "chunk": chunk,
+        "frames": frame_index - chunk["start"],
+        "missing": chunk["end"] - frame_index,
+        "seek": seek,
+        "means": np.array(means, dtype=np.float32) if _worker_monitor is not None else None,
+        "objects": objects,
+        "gate": gate.stats() if gate is not None else None,
+    }
+
+
+def reanalyze(segments, rects, logger, target_color=None, colors=False, objects=False,
+              workers=None, chunk_frames=1800, object_stride=1, threshold=COLOR_THRESHOLD,
+              color_space=COLOR_SPACE):
+    """
+    Analyze all chunks in a process pool and merge the results, in frame order,
+    into one event log. Returns a summary dict.
+    """
+    colors = colors and target_color is not None
+    monitor = None
+    if colors:
+        monitor = ColorMonitor(target_color, threshold, COLOR_HYSTERESIS, COLOR_DEBOUNCE_FRAMES,
+                               color_space, COLOR_DOWNSCALE, logger=logger)
+    sequential = set()
+    for index, seg in enumerate(segments):
+        if seg["frames"] > chunk_frames and not seeks_exactly(seg["path"], chunk_frames):
+            print(f"[Reanalyze] Warning: seeking in {seg['path']} is not frame-accurate, "
+                  f"decoding it as one sequential chunk")
+            sequential.add(index)
+    chunks = plan_chunks(segments, chunk_frames, sequential)
+    workers = workers or os.cpu_count() or 1
+    color_settings = (color_space, COLOR_DOWNSCALE) if colors else None
+    tasks = [(chunk, rects, max(1, object_stride)) for chunk in chunks]
+    print(f"[Reanalyze] {sum(s['frames'] for s in segments)} frames in {len(segments)} file(s), "
+          f"{len(chunks)} chunk(s) on {workers} worker(s)")
+
+    object_state = {}
+    gaps = []
+    resynced = 0
+    frames = 0
+    inferences = 0
+    skipped = 0
+    duration = sum(s["frames"] / s["fps"] for s in segments)
+    start = time.perf_counter()
+    with Pool(workers, initializer=_init_worker, initargs=(color_settings, objects)) as pool:
+        # imap keeps chunk order, so events come out time-ordered while later chunks still run
+        for done, result in enumerate(pool.imap(_analyze_chunk, tasks), start=1):
+            chunk = result["chunk"]
+            segment = segments[chunk["segment"]]
+            detections = dict(result["objects"])
+            for i in range(result["frames"]):
+                frame_index = chunk["start"] + i
+                timestamp, now = frame_time(segment, frame_index)
+                if monitor is not None:
+                    monitor.update_means(result["means"][i], timestamp, now)
+                if frame_index in detections:
+                    for idx, labels in enumerate(detections[frame_index], start=1):
+                        if object_state.get(idx) != labels:
+                            object_state[idx] = labels
+                            logger.log(timestamp, f"ROI {idx} objects: {labels if labels else 'none'}")
+            frames += result["frames"]
+            if result["seek"] in ("keyframe", "rewind"):
+                resynced += 1
+            if result["missing"]:
+                first = chunk["start"] + result["frames"]
+                gaps.append({"path": chunk["path"], "frame": first, "frames": result["missing"]})
+                print(f"[Reanalyze] Warning: {chunk['path']} ended early, frames {first}-{chunk['end'] - 1} "
+                      f"could not be decoded and were not analyzed")
+            if result["gate"] is not None:
+                inferences += result["gate"]["inferences"]
+                skipped += result["gate"]["skipped"]
+            elapsed = time.perf_counter() - start
+            print(f"[Reanalyze] Chunk {done}/{len(chunks)} done, {frames / elapsed:.1f} frames/s")
+
+    elapsed = time.perf_counter() - start
+    return {"frames": frames, "chunks": len(chunks), "workers": workers, "elapsed_s": elapsed,
+            "fps": frames / elapsed if elapsed > 0 else 0.0,
+            "speedup": duration / elapsed if elapsed > 0 else 0.0,
+            "inferences": inferences, "skipped": skipped, "resynced": resynced, "gaps": gaps}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Re-run color/object monitoring over recorded footage.")
+    parser.add_argument("inputs", nargs="+",
+                        help="A recording index CSV (footages/<name>_index.csv) or video files in order")
+    parser.add_argument("--roi", action="append", type=parse_ints, metavar="X1,Y1,X2,Y2",
+                        help="ROI rectangle; repeat for several ROIs")
+    parser.add_argument("--rois-file", help="ROI layout JSON saved by the GUI")
+    parser.add_argument("--target-color", type=parse_ints, metavar="B,G,R",
+                        help="Target color for color monitoring")
+    parser.add_argument("--colors", action="store_true", help="Enable color monitoring")
+    parser.add_argument("--objects", action="store_true", help="Enable object monitoring")
+    parser.add_argument("--threshold", type=float, default=COLOR_THRESHOLD, help="Color change threshold")
+    parser.add_argument("--color-space", default=COLOR_SPACE, choices=["bgr", "lab", "hsv"])
+    parser.add_argument("--object-stride", type=int, default=1, help="Detect objects every N frames")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: all cores)")
+    parser.add_argument("--chunk-frames", type=int, default=1800, help="Frames per work chunk")
+    parser.add_argument("--fps", type=float, help="Frame rate of plain video files (default: from the file)")
+    parser.add_argument("--start", help="Recording start for plain video files, e.g. 2024-05-01_20-00-00")
+    parser.add_argument("--log-file", help="Event log (default: logs/reanalysis_<input>.csv)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    start = parse_start(args.start) if args.start else None
+    try:
+        segments = load_footage(args.inputs, args.fps, start)
+    except IOError as e:
+        print(f"[Reanalyze] {e}")
+        return
+    if not segments:
+        print("[Reanalyze] No frames to analyze.")
+        return
+
+    roi_manager = ROIManager(segments[0]["size"])
+    if args.rois_file:
+        # --roi boxes are in video pixels, so the layout is scaled to the video first
+        roi_manager.load(args.rois_file, segments[0]["size"])
+    for x1, y1, x2, y2 in args.roi or []:
+        roi_manager.add_box((x1, y1), (x2, y2))
+    if not len(roi_manager):
+        print("[Reanalyze] No ROIs given (--roi or --rois-file).")
+        return
+
+    stem = os.path.splitext(os.path.basename(args.inputs[0]))[0]
+    log_file = args.log_file or os.path.join(OUTPUT_DIR, f"reanalysis_{stem}.csv")
+    # Rotation would split one analysis run across files, so it's off here
+    logger = Logger(log_file, LOG_FLUSH_SIZE, LOG_FLUSH_INTERVAL, max_bytes=None)
+    try:
+        summary = reanalyze(segments, roi_manager.rect_list, logger, args.target_color, args.colors,
+                            args.objects, args.workers, args.chunk_frames, args.object_stride,
+                            args.threshold, args.color_space)
+    finally:
+        logger.close()
+    print(f"[Reanalyze] {summary['frames']} frames in {summary['elapsed_s']:.1f}s "
+          f"({summary['fps']:.1f} fps, {summary['speedup']:.1f}x real time), events in {log_file}")
+    if summary["gaps"]:
+        missing = sum(gap["frames"] for gap in summary["gaps"])
+        print(f"[Reanalyze] {missing} frame(s) in {len(summary['gaps'])} gap(s) could not be decoded")
+    if summary["resynced"]:
+        print(f"[Reanalyze] {summary['resynced']} chunk(s) needed decoding forward after an inexact seek")
+    if args.objects and summary["inferences"] + summary["skipped"]:
+        print(f"[Reanalyze] Inferences run: {summary['inferences']}, skipped (no motion): {summary['skipped']}")
+
+
+if __name__ == "__main__":
+    main()
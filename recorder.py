@@ -0,0 +1,161 @@
+import csv
+import os
+import queue
+import threading
+import time
+import cv2
+
+# Container extension per codec
+CODEC_EXTENSIONS = {"MJPG": ".avi", "XVID": ".avi", "mp4v": ".mp4"}
+
+
+class VideoRecorder:
+    """
+    Encodes frames on its own thread from a bounded queue.
+    Output is split into segments of at most `segment_seconds` seconds and/or
+    `segment_bytes` bytes, named <name>_000.avi, <name>_001.avi, ...
+    A sidecar <name>_index.csv maps every written frame to its segment, frame
+    number within the segment and capture timestamps, so playback can seek to
+    a logged event.
+    """
+    def __init__(self, directory, name, codec="XVID", fps=15, segment_seconds=None,
+                 segment_bytes=None, queue_size=64):
+        if codec not in CODEC_EXTENSIONS:
+            raise ValueError(f"Unsupported codec: {codec}")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.name = name
+        self.codec = codec
+        self.fps = fps
+        self.segment_seconds = segment_seconds
+        self.segment_bytes = segment_bytes
+        self.queue = queue.Queue(maxsize=queue_size)
+
+        self.writer = None
+        self.segment = -1
+        self.segment_path = None
+        self.segment_frames = 0
+        self.segment_started = None
+        self.frame_size = None
+        self.failed = False
+
+        self.index_path = os.path.join(directory, f"{name}_index.csv")
+        self.index_file = open(self.index_path, "w", newline="")
+        self.index = csv.writer(self.index_file)
+        self.index.writerow(["Segment", "File", "Frame", "Timestamp", "CaptureTime"])
+
+        # Counters
+        self.written = 0
+        self.dropped = 0
+        self.encode_time = 0.0
+
+        self.thread = threading.Thread(target=self._run, name="VideoRecorder", daemon=True)
+        self.thread.start()
+
+    def write(self, frame, timestamp, capture_time=None):
+        """
+        Queue a frame for encoding. Returns False (and counts a drop) when the
+        encoder is behind and the queue is full. The frame must not be modified afterwards.
+        """
+        if self.failed:
+            self.dropped += 1
+            return False
+        capture_time = time.monotonic() if capture_time is None else capture_time
+        try:
+            self.queue.put_nowait((frame, timestamp, capture_time))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _segment_full(self, capture_time):
+        if self.writer is None:
+            return True
+        if self.segment_seconds and capture_time - self.segment_started >= self.segment_seconds:
+            return True
+        # Checking the file size every frame would cost a stat() per frame
+        if self.segment_bytes and self.segment_frames % 30 == 0:
+            try:
+                return os.path.getsize(self.segment_path) >= self.segment_bytes
+            except OSError:
+                # Nothing flushed to disk yet
+                return False
+        return False
+
+    def _open_segment(self, capture_time):
+        """
+        Start the next segment. Returns False if the writer could not be opened.
+        """
+        if self.writer is not None:
+            self.writer.release()
+        self.segment += 1
+        self.segment_path = os.path.join(self.directory,
+                                         f"{self.name}_{self.segment:03d}{CODEC_EXTENSIONS[self.codec]}")
+        fourcc = cv2.VideoWriter_fourcc(*self.codec)
+        self.writer = cv2.VideoWriter(self.segment_path, fourcc, self.fps, self.frame_size)
+        if not self.writer.isOpened():
+            print(f"[Video] Could not open {self.segment_path} with codec {self.codec}, recording stopped")
+            self.writer.release()
+            self.writer = None
+            return False
+        self.segment_frames = 0
+        self.segment_started = capture_time
+        print(f"[Video] Writing segment: {self.segment_path}")
+        return True
+
+    def _run(self):
+        try:
+            while True:
+                job = self.queue.get()
+                if job is None:
+                    break
+                if self.failed:
+                    # Keep draining so stop() never blocks on a full queue
+                    self.dropped += 1
+                    continue
+                frame, timestamp, capture_time = job
+                if self.frame_size is None:
+                    # Use the real frame size, not what the capture device claims
+                    self.frame_size = (frame.shape[1], frame.shape[0])
+                if (frame.shape[1], frame.shape[0]) != self.frame_size:
+                    frame = cv2.resize(frame, self.frame_size)
+
+                t0 = time.perf_counter()
+                if self._segment_full(capture_time) and not self._open_segment(capture_time):
+                    self.failed = True
+                    self.dropped += 1
+                    continue
+                self.writer.write(frame)
+                self.encode_time += time.perf_counter() - t0
+
+                self.index.writerow([self.segment, os.path.basename(self.segment_path),
+                                     self.segment_frames, timestamp, f"{capture_time:.6f}"])
+                self.segment_frames += 1
+                self.written += 1
+        finally:
+            if self.writer is not None:
+                self.writer.release()
+                self.writer = None
+            self.index_file.close()
+
+    def stats(self):
+        return {
+            "written": self.written,
+            "dropped": self.dropped,
+            "queued": self.queue.qsize(),
+            "segments": self.segment + (0 if self.failed else 1),
+            "failed": self.failed,
+            "encode_fps": self.written / self.encode_time if self.encode_time > 0 else 0.0,
+        }
+
+    def stop(self):
+        """
+        Encode whatever is still queued, then close the current segment and index.
+        """
+        if self.thread.is_alive():
+            self.queue.put(None)
+        self.thread.join()
+        stats = self.stats()
+        print(f"[Video] Recording stopped: {stats['written']} frames in {stats['segments']} segment(s), "
+              f"{stats['dropped']} dropped, {stats['encode_fps']:.1f} fps encoding")
+        return stats
@@ -1,15 +1,184 @@
+import json
+import os
 import cv2
+import numpy as np
+
+
+def rects_contain(rects, points):
+    """
+    (N rects, M points) boolean matrix: does x1, y1, x2, y2 rect i contain point j?
+    """
+    r = np.asarray(rects).reshape(-1, 4)[:, :, None]
+    points = np.asarray(points).reshape(-1, 2)
+    x = points[None, :, 0]
+    y = points[None, :, 1]
+    return (x >= r[:, 0]) & (x < r[:, 2]) & (y >= r[:, 1]) & (y < r[:, 3])
+
+
+def rects_iou(rects_a, rects_b):
+    """
+    (N, M) intersection-over-union matrix between two sets of x1, y1, x2, y2 rects.
+    """
+    a = np.asarray(rects_a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(rects_b, dtype=np.float64).reshape(-1, 4)
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(union > 0, inter / union, 0.0)
+
 
 class ROIManager:
-    def __init__(self):
-        self.roi_boxes = []
+    """
+    Stores ROIs as an (N, 4) int32 array of normalized x1, y1, x2, y2 rectangles
+    (x1 < x2, y1 < y2, clamped to the frame once its size is known), with stable
+    IDs and names. Slices and tuple views are rebuilt only when ROIs change, so
+    per-frame code can use them directly.
+    """
+    def __init__(self, frame_size=None):
+        self.frame_size = tuple(frame_size) if frame_size else None
+        self.rects = np.empty((0, 4), dtype=np.int32)
+        self.ids = []
+        self.names = []
+        self.next_id = 1
+        self._refresh()
+
+    def _refresh(self):
+        """
+        Rebuild the cached views after the ROI array changed.
+        """
+        self.rect_list = [tuple(int(v) for v in r) for r in self.rects]
+        self.slices = [(slice(y1, y2), slice(x1, x2)) for x1, y1, x2, y2 in self.rect_list]
+        self.roi_boxes = [((x1, y1), (x2, y2)) for x1, y1, x2, y2 in self.rect_list]
+
+    def _normalize(self, rects):
+        rects = np.asarray(rects, dtype=np.int64).reshape(-1, 4)
+        x1 = np.minimum(rects[:, 0], rects[:, 2])
+        x2 = np.maximum(rects[:, 0], rects[:, 2])
+        y1 = np.minimum(rects[:, 1], rects[:, 3])
+        y2 = np.maximum(rects[:, 1], rects[:, 3])
+        out = np.stack([x1, y1, x2, y2], axis=1)
+        if self.frame_size is not None:
+            width, height = self.frame_size
+            out[:, [0, 2]] = np.clip(out[:, [0, 2]], 0, width)
+            out[:, [1, 3]] = np.clip(out[:, [1, 3]], 0, height)
+        return out.astype(np.int32)
+
+    def __len__(self):
+        return len(self.ids)
 
-    def add_box(self, top_left, bottom_right):
-        self.roi_boxes.append((top_left, bottom_right))
+    def add_box(self, top_left, bottom_right, name=None):
+        """
+        Add a ROI from two corners in any order. Returns its ID, or None if the
+        rectangle is empty after normalizing and clamping.
+        """
+        rect = self._normalize([*top_left, *bottom_right])
+        x1, y1, x2, y2 = rect[0]
+        if x2 <= x1 or y2 <= y1:
+            print(f"[ROI] Ignored empty ROI {tuple(top_left)} to {tuple(bottom_right)}")
+            return None
+        roi_id = self.next_id
+        self.next_id += 1
+        self.rects = np.vstack([self.rects, rect])
+        self.ids.append(roi_id)
+        self.names.append(name or f"ROI {roi_id}")
+        self._refresh()
+        return roi_id
+
+    def remove_box(self, roi_id):
+        if roi_id not in self.ids:
+            return False
+        i = self.ids.index(roi_id)
+        self.rects = np.delete(self.rects, i, axis=0)
+        del self.ids[i]
+        del self.names[i]
+        self._refresh()
+        return True
 
     def clear_boxes(self):
-        self.roi_boxes = []
+        self.rects = np.empty((0, 4), dtype=np.int32)
+        self.ids = []
+        self.names = []
+        self._refresh()
+
+    def set_frame_size(self, width, height):
+        """
+        Tell the manager the frame resolution. ROIs defined at another resolution
+        (e.g. loaded from a layout file) are scaled, then everything is clamped.
+        """
+        size = (int(width), int(height))
+        if size == self.frame_size:
+            return
+        if self.frame_size is not None and len(self.ids):
+            self.rects = self.scaled(size)
+        self.frame_size = size
+        self.rects = self._normalize(self.rects)
+        self._refresh()
+
+    def crops(self, frame):
+        """
+        Views of `frame` for every ROI, in order.
+        """
+        return [frame[s] for s in self.slices]
+
+    def contains(self, points):
+        """
+        (N ROIs, M points) boolean matrix: does ROI i contain point j?
+        """
+        return rects_contain(self.rects, points)
+
+    def overlaps(self):
+        """
+        (N, N) intersection-over-union matrix between all ROIs.
+        """
+        return rects_iou(self.rects, self.rects)
+
+    def scaled(self, new_size, old_size=None):
+        """
+        ROI array mapped from `old_size` (default: current frame size) to `new_size`.
+        """
+        old_size = old_size or self.frame_size
+        if old_size is None:
+            raise ValueError("Frame size unknown; pass old_size")
+        sx = new_size[0] / old_size[0]
+        sy = new_size[1] / old_size[1]
+        factors = np.array([sx, sy, sx, sy])
+        return np.rint(self.rects * factors).astype(np.int32)
+
+    def save(self, path):
+        layout = {
+            "frame_size": list(self.frame_size) if self.frame_size else None,
+            "rois": [{"id": roi_id, "name": name, "rect": list(rect)}
+                     for roi_id, name, rect in zip(self.ids, self.names, self.rect_list)],
+        }
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(layout, f, indent=2)
+
+    def load(self, path, frame_size=None):
+        """
+        Replace the current ROIs with a layout saved by save().
+        With `frame_size` (the resolution of the frames they'll be used on), the
+        layout is scaled to it right away, so ROIs added afterwards can be given
+        in frame pixels.
+        """
+        with open(path, "r") as f:
+            layout = json.load(f)
+        rois = layout.get("rois", [])
+        self.frame_size = tuple(layout["frame_size"]) if layout.get("frame_size") else None
+        self.rects = self._normalize([roi["rect"] for roi in rois]) if rois else np.empty((0, 4), dtype=np.int32)
+        self.ids = [roi.get("id", i + 1) for i, roi in enumerate(rois)]
+        self.names = [roi.get("name") or f"ROI {roi_id}" for roi, roi_id in zip(rois, self.ids)]
+        self.next_id = max(self.ids, default=0) + 1
+        self._refresh()
+        if frame_size:
+            self.set_frame_size(*frame_size)
 
     def draw_rois(self, frame, color=(0, 255, 0)):
-        for box in self.roi_boxes:
-            cv2.rectangle(frame, box[0], box[1], color, 2)
+        for x1, y1, x2, y2 in self.rect_list:
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
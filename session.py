@@ -0,0 +1,343 @@
+import argparse
+import json
+import os
+import threading
+import time
+from collections import deque
+from config import (FRAME_RATE, OUTPUT_DIR, CAPTURE_BUFFER_SIZE,
+                    LOG_FLUSH_SIZE, LOG_FLUSH_INTERVAL, LOG_MAX_BYTES, LOG_ROTATE_DAILY,
+                    COLOR_THRESHOLD, COLOR_HYSTERESIS, COLOR_DEBOUNCE_FRAMES, COLOR_SPACE,
+                    COLOR_DOWNSCALE, MOTION_GATE, MOTION_THRESHOLD, MOTION_MAX_AGE, FRAME_BUS_SLOTS)
+from camera import Camera
+from logger import Logger
+from roi_manager import ROIManager
+from utils import ImageRecognitionUtils
+from color_monitor import ColorMonitor
+from motion_gate import MotionGate
+from headless import parse_source
+
+
+class InferenceScheduler:
+    """
+    Shared object-detection pool for several cameras.
+    Each worker owns one model, so memory and CPU scale with `workers`, not with
+    the number of cameras. Every camera has a single pending slot ("drop if busy,
+    keep newest") and at most one job in flight. Workers serve cameras round-robin
+    and pack jobs from several cameras into one forward pass, up to `max_batch_rois` ROIs.
+    """
+    def __init__(self, workers=1, max_batch_rois=16, vision_utils_factory=None):
+        self.max_batch_rois = max_batch_rois
+        self.cond = threading.Condition()
+        self.pending = {}
+        self.in_flight = set()
+        self.order = deque()
+        self.running = True
+
+        # Counters
+        self.submitted = 0
+        self.dropped = 0
+        self.batches = 0
+        self.batched_rois = 0
+
+        # Models load lazily, each on its worker thread's first batch
+        vision_utils_factory = vision_utils_factory or (lambda: ImageRecognitionUtils(lazy=True))
+        self.models = [vision_utils_factory() for _ in range(workers)]
+        self.threads = [threading.Thread(target=self._run, args=(model,), name=f"Inference-{i}", daemon=True)
+                        for i, model in enumerate(self.models)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, camera_name, frame, timestamp, rects, callback, motion_gate=None):
+        """
+        Queue detection for one camera's frame. `callback(timestamp, detections)` is
+        called from a worker thread with one detection list per rect (frame coordinates).
+        Returns False if this replaced a job that was still waiting.
+        """
+        job = {"camera": camera_name, "frame": frame, "timestamp": timestamp, "rects": list(rects),
+               "callback": callback, "motion_gate": motion_gate}
+        with self.cond:
+            if not self.running:
+                return False
+            self.submitted += 1
+            if camera_name not in self.order:
+                self.order.append(camera_name)
+            replaced = camera_name in self.pending
+            if replaced:
+                self.dropped += 1
+            self.pending[camera_name] = job
+            self.cond.notify()
+            return not replaced
+
+    def _take_batch(self):
+        """
+        Pick jobs round-robin from cameras without a job in flight. Called with the lock held.
+        """
+        batch = []
+        rois = 0
+        for name in list(self.order):
+            job = self.pending.get(name)
+            if job is None or name in self.in_flight:
+                continue
+            if batch and rois + len(job["rects"]) > self.max_batch_rois:
+                continue
+            batch.append(self.pending.pop(name))
+            self.in_flight.add(name)
+            rois += len(job["rects"])
+            # Served cameras go to the back of the line
+            self.order.remove(name)
+            self.order.append(name)
+        return batch
+
+    def _run(self, vision_utils):
+        while True:
+            with self.cond:
+                batch = self._take_batch()
+                while not batch and self.running:
+                    self.cond.wait()
+                    batch = self._take_batch()
+                if not batch:
+                    return
+            try:
+                self._process(vision_utils, batch)
+            except Exception as e:
+                print(f"[Session] Inference error: {e}")
+            finally:
+                with self.cond:
+                    for job in batch:
+                        self.in_flight.discard(job["camera"])
+                    self.cond.notify_all()
+
+    def _process(self, vision_utils, batch):
+        now = time.monotonic()
+        crops = []
+        offsets = []
+        plans = []
+        for job in batch:
+            frame = job["frame"]
+            rois = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in job["rects"]]
+            gate = job["motion_gate"]
+            if gate is not None:
+                stale, prints = gate.select(rois, job["rects"], now)
+            else:
+                stale, prints = list(range(len(rois))), None
+            plans.append((job, stale, prints, len(crops)))
+            crops.extend(rois[i] for i in stale)
+            offsets.extend(job["rects"][i][:2] for i in stale)
+
+        # One forward pass for every stale ROI of every camera in the batch
+        results = vision_utils.detect_objects_batch(crops, offsets) if crops else []
+        with self.cond:
+            self.batches += 1
+            self.batched_rois += len(crops)
+
+        for job, stale, prints, start in plans:
+            fresh = results[start:start + len(stale)]
+            gate = job["motion_gate"]
+            if gate is not None:
+                detections = gate.store(stale, prints, job["rects"], fresh, now)
+            else:
+                detections = fresh
+            job["callback"](job["timestamp"], detections)
+
+    def stats(self):
+        with self.cond:
+            return {
+                "workers": len(self.models),
+                "submitted": self.submitted,
+                "dropped": self.dropped,
+                "batches": self.batches,
+                "rois_per_batch": self.batched_rois / self.batches if self.batches else 0.0,
+                "pending": len(self.pending),
+            }
+
+    def shutdown(self, drain=True):
+        """
+        Stop accepting jobs and wait for the workers. With `drain`, jobs already
+        waiting are still run (and their callbacks called) first.
+        """
+        with self.cond:
+            self.running = False
+            if not drain:
+                self.pending.clear()
+            self.cond.notify_all()
+        for thread in self.threads:
+            thread.join(timeout=5)
+
+
+class CameraStream:
+    """
+    One camera in a session: its own capture thread, ROIs, color monitor,
+    motion gate and log file. Object detection goes through the shared scheduler.
+    """
+    def __init__(self, name, camera, roi_manager, logger, scheduler, target_color=None,
+                 color_monitoring=False, object_monitoring=False):
+        self.name = name
+        self.camera = camera
+        self.roi_manager = roi_manager
+        self.logger = logger
+        self.scheduler = scheduler
+        self.color_monitor = None
+        if color_monitoring and target_color is not None:
+            self.color_monitor = ColorMonitor(target_color, COLOR_THRESHOLD, COLOR_HYSTERESIS,
+                                              COLOR_DEBOUNCE_FRAMES, COLOR_SPACE, COLOR_DOWNSCALE,
+                                              logger=logger)
+        self.object_monitoring = object_monitoring
+        self.motion_gate = MotionGate(MOTION_THRESHOLD, MOTION_MAX_AGE) if MOTION_GATE else None
+
+        self.frames = 0
+        self.results = 0
+        self.object_state = {}
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name=f"Stream-{self.name}", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        last_seq = 0
+        engine = self.camera.engine
+        while self.running:
+            record = engine.next_after(last_seq, timeout=0.5)
+            if record is None:
+                if not engine.running:
+                    print(f"[Session] {self.name}: capture stopped.")
+                    break
+                continue
+            # Always jump to the newest frame; the capture engine counts what was skipped
+            record = engine.latest() or record
+            last_seq = record.seq
+            frame, timestamp = record.image, record.timestamp
+            self.frames += 1
+
+            self.roi_manager.set_frame_size(frame.shape[1], frame.shape[0])
+            rects = self.roi_manager.rect_list
+            if not rects:
+                continue
+            if self.color_monitor is not None:
+                self.color_monitor.update(frame, rects, timestamp)
+            if self.object_monitoring:
+                self.scheduler.submit(self.name, frame, timestamp, rects, self._on_detections,
+                                      self.motion_gate)
+        self.running = False
+
+    def _on_detections(self, timestamp, detections):
+        self.results += 1
+        for idx, dets in enumerate(detections, start=1):
+            labels = sorted(d["label"] for d in dets)
+            if self.object_state.get(idx) != labels:
+                self.object_state[idx] = labels
+                self.logger.log(timestamp, f"ROI {idx} objects: {labels if labels else 'none'}")
+
+    def stats(self):
+        stats = {"frames": self.frames, "results": self.results}
+        stats.update(self.camera.engine.stats())
+        if self.motion_gate is not None:
+            stats.update(self.motion_gate.stats())
+        return stats
+
+    def stop(self):
+        """
+        Stop capturing. The logger stays open for detections still in the scheduler.
+        """
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+        self.camera.release()
+
+    def close(self):
+        self.logger.close()
+
+
+class MonitoringSession:
+    """
+    Several cameras, each with its own ROIs, capture thread and log stream,
+    sharing one InferenceScheduler.
+    """
+    def __init__(self, inference_workers=1, max_batch_rois=16):
+        self.scheduler = InferenceScheduler(inference_workers, max_batch_rois)
+        self.streams = []
+
+    def add_camera(self, name, source, rois=(), target_color=None, colors=False, objects=False,
+                   log_file=None, frame_rate=FRAME_RATE, rois_file=None, frame_bus=None):
+        camera = Camera(source, frame_rate, threaded=True, buffer_size=CAPTURE_BUFFER_SIZE,
+                        frame_bus=frame_bus, frame_bus_slots=FRAME_BUS_SLOTS)
+        if not camera.cap.isOpened():
+            camera.release()
+            raise IOError(f"Could not open video source for {name}: {source}")
+        roi_manager = ROIManager()
+        if rois_file:
+            # Scale the layout to this camera first: `rois` are in its pixels
+            roi_manager.load(rois_file, camera.frame_size())
+        for x1, y1, x2, y2 in rois:
+            roi_manager.add_box((x1, y1), (x2, y2))
+        log_file = log_file or os.path.join(OUTPUT_DIR, f"{name}_log.csv")
+        logger = Logger(log_file, LOG_FLUSH_SIZE, LOG_FLUSH_INTERVAL, LOG_MAX_BYTES, LOG_ROTATE_DAILY)
+        stream = CameraStream(name, camera, roi_manager, logger, self.scheduler,
+                              target_color, colors, objects)
+        self.streams.append(stream)
+        return stream
+
+    def start(self):
+        for stream in self.streams:
+            stream.start()
+        print(f"[Session] Started {len(self.streams)} camera(s) with "
+              f"{len(self.scheduler.models)} inference worker(s).")
+
+    def active(self):
+        return any(stream.running for stream in self.streams)
+
+    def stop(self):
+        # Capture first, then let in-flight detections log, then close the logs
+        for stream in self.streams:
+            stream.stop()
+        self.scheduler.shutdown()
+        for stream in self.streams:
+            stream.close()
+
+    def print_summary(self):
+        for stream in self.streams:
+            s = stream.stats()
+            print(f"[Session] {stream.name}: {s['frames']} frames analyzed, {s['captured']} captured, "
+                  f"{s['dropped']} skipped, {s['results']} detection results")
+        s = self.scheduler.stats()
+        print(f"[Session] Scheduler: {s['batches']} batches, {s['rois_per_batch']:.1f} ROIs/batch, "
+              f"{s['dropped']} jobs replaced while waiting")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monitor several cameras with one shared detection pool.")
+    parser.add_argument("--config", required=True,
+                        help="JSON file: {\"inference_workers\": 1, \"max_batch_rois\": 16, \"cameras\": "
+                             "[{\"name\", \"source\", \"rois\", \"target_color\", \"colors\", \"objects\", "
+                             "\"log_file\", \"frame_rate\", \"rois_file\", \"frame_bus\"}, ...]}")
+    parser.add_argument("--duration", type=float, help="Stop after this many seconds")
+    args = parser.parse_args(argv)
+
+    with open(args.config, "r") as f:
+        settings = json.load(f)
+
+    session = MonitoringSession(settings.get("inference_workers", 1), settings.get("max_batch_rois", 16))
+    try:
+        for i, cam in enumerate(settings.get("cameras", [])):
+            session.add_camera(cam.get("name", f"cam{i}"), parse_source(cam.get("source", i)),
+                               cam.get("rois", []), cam.get("target_color"), cam.get("colors", False),
+                               cam.get("objects", False), cam.get("log_file"),
+                               cam.get("frame_rate", FRAME_RATE), cam.get("rois_file"),
+                               cam.get("frame_bus"))
+        session.start()
+        deadline = time.monotonic() + args.duration if args.duration else None
+        while session.active() and (deadline is None or time.monotonic() < deadline):
+            time.sleep(0.2)
+    except KeyboardInterrupt:
+        print("[Session] Interrupted.")
+    except IOError as e:
+        print(f"[Session] {e}")
+    finally:
+        session.stop()
+        session.print_summary()
+
+
+if __name__ == "__main__":
+    main()
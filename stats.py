@@ -0,0 +1,191 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+
+
+class PipelineStats:
+    """
+    Low-overhead pipeline instrumentation.
+    - Stage latencies: the last `window` samples per stage, summarized on demand.
+    - Rates: event times over the last `rate_window` seconds (effective fps).
+    - Gauges/counters: callables polled only when a snapshot is taken, e.g. queue
+      depths or the dropped-frame counters other components already keep.
+    Recording a sample is one perf_counter() pair and a deque append, so it can
+    stay on in production.
+    """
+    def __init__(self, window=300, rate_window=5.0):
+        self.window = window
+        self.rate_window = rate_window
+        self.samples = {}
+        self.events = {}
+        self.sources = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - t0)
+
+    def record(self, name, seconds):
+        samples = self.samples.get(name)
+        if samples is None:
+            with self.lock:
+                samples = self.samples.setdefault(name, deque(maxlen=self.window))
+        samples.append(seconds)
+
+    def tick(self, name):
+        """
+        Count one occurrence of `name` (e.g. a captured or rendered frame) for its rate.
+        """
+        events = self.events.get(name)
+        if events is None:
+            with self.lock:
+                events = self.events.setdefault(name, deque(maxlen=10000))
+        events.append(time.monotonic())
+
+    def register(self, name, fn):
+        """
+        Register a callable returning a number or a dict of numbers
+        (queue depth, dropped frames, ...), polled at snapshot time.
+        """
+        with self.lock:
+            self.sources[name] = fn
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self.lock:
+            samples = {name: list(values) for name, values in self.samples.items()}
+            events = {name: list(values) for name, values in self.events.items()}
+            sources = dict(self.sources)
+
+        stages = {}
+        for name, values in samples.items():
+            if not values:
+                continue
+            ms = np.asarray(values) * 1000
+            stages[name] = {
+                "count": len(ms),
+                "mean_ms": float(ms.mean()),
+                "p50_ms": float(np.percentile(ms, 50)),
+                "p90_ms": float(np.percentile(ms, 90)),
+                "p99_ms": float(np.percentile(ms, 99)),
+                "max_ms": float(ms.max()),
+            }
+
+        rates = {}
+        for name, times in events.items():
+            recent = [t for t in times if now - t <= self.rate_window]
+            span = now - recent[0] if len(recent) > 1 else 0.0
+            rates[name] = (len(recent) - 1) / span if span > 0 else 0.0
+
+        gauges = {}
+        for name, fn in sources.items():
+            try:
+                value = fn()
+            except Exception as e:
+                print(f"[Stats] Could not read {name}: {e}")
+                continue
+            if isinstance(value, dict):
+                for key, v in value.items():
+                    if isinstance(v, (int, float)):
+                        gauges[f"{name}_{key}"] = float(v)
+            elif value is not None:
+                gauges[name] = float(value)
+
+        return {"time": time.time(), "stages": stages, "rates": rates, "gauges": gauges}
+
+    def format_text(self, snapshot=None):
+        """
+        Human-readable summary, one line per stage/rate/gauge.
+        """
+        snapshot = snapshot or self.snapshot()
+        lines = []
+        for name, s in snapshot["stages"].items():
+            lines.append(f"{name:<12} p50 {s['p50_ms']:7.2f}  p99 {s['p99_ms']:7.2f}  max {s['max_ms']:7.2f} ms")
+        for name, fps in snapshot["rates"].items():
+            lines.append(f"{name:<12} {fps:7.1f} /s")
+        for name, value in snapshot["gauges"].items():
+            lines.append(f"{name:<24} {value:g}")
+        return "\n".join(lines)
+
+    def write_prometheus(self, path, snapshot=None):
+        """
+        Overwrite `path` with the snapshot in Prometheus text exposition format.
+        """
+        snapshot = snapshot or self.snapshot()
+        lines = ["# TYPE labbot_stage_latency_ms summary"]
+        for name, s in snapshot["stages"].items():
+            for q in ("50", "90", "99"):
+                lines.append(f'labbot_stage_latency_ms{{stage="{name}",quantile="0.{q}"}} {s["p" + q + "_ms"]:.4f}')
+            lines.append(f'labbot_stage_latency_ms_count{{stage="{name}"}} {s["count"]}')
+        lines.append("# TYPE labbot_rate_per_second gauge")
+        for name, fps in snapshot["rates"].items():
+            lines.append(f'labbot_rate_per_second{{name="{name}"}} {fps:.3f}')
+        lines.append("# TYPE labbot_gauge gauge")
+        for name, value in snapshot["gauges"].items():
+            lines.append(f'labbot_gauge{{name="{name}"}} {value:g}')
+
+        # Write then rename so scrapers never see a half-written file
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+    def write_csv(self, path, snapshot=None):
+        """
+        Append the snapshot to `path` as long-format rows: time, kind, name, field, value.
+        """
+        snapshot = snapshot or self.snapshot()
+        new_file = not os.path.exists(path)
+        with open(path, "a") as f:
+            if new_file:
+                f.write("Time,Kind,Name,Field,Value\n")
+            t = f"{snapshot['time']:.3f}"
+            for name, s in snapshot["stages"].items():
+                for field, value in s.items():
+                    f.write(f"{t},stage,{name},{field},{value:g}\n")
+            for name, fps in snapshot["rates"].items():
+                f.write(f"{t},rate,{name},per_second,{fps:g}\n")
+            for name, value in snapshot["gauges"].items():
+                f.write(f"{t},gauge,{name},value,{value:g}\n")
+
+
+class StatsDumper:
+    """
+    Periodically writes PipelineStats snapshots to a file ("prometheus" or "csv").
+    """
+    def __init__(self, stats, path, fmt="prometheus", interval=10.0):
+        if fmt not in ("prometheus", "csv"):
+            raise ValueError(f"Unsupported stats format: {fmt}")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.stats = stats
+        self.path = path
+        self.fmt = fmt
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="StatsDumper", daemon=True)
+        self.thread.start()
+
+    def dump(self):
+        try:
+            if self.fmt == "prometheus":
+                self.stats.write_prometheus(self.path)
+            else:
+                self.stats.write_csv(self.path)
+        except (IOError, OSError) as e:
+            print(f"[Stats] Could not write {self.path}: {e}")
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.dump()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        self.dump()
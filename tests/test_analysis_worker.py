@@ -0,0 +1,69 @@
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+from analysis import AnalysisWorker
+
+
+class InstantUtils:
+    """
+    Stand-in for ImageRecognitionUtils that answers immediately.
+    """
+    def detect_objects_batch(self, rois, offsets):
+        return [[] for _ in rois]
+
+
+class InlineExecutor:
+    """
+    Runs jobs inside submit(), so the returned future is already done and
+    add_done_callback() calls back on the submitting thread.
+    """
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+FRAME = np.zeros((48, 64, 3), dtype=np.uint8)
+RECTS = [(0, 0, 32, 24), (32, 24, 64, 48)]
+
+
+def _submit_in_thread(worker, count):
+    thread = threading.Thread(target=lambda: [worker.submit(FRAME, f"t{i}", RECTS) for i in range(count)],
+                              daemon=True)
+    thread.start()
+    thread.join(timeout=5)
+    return not thread.is_alive()
+
+
+def test_completed_inline_job_does_not_deadlock():
+    worker = AnalysisWorker(InstantUtils())
+    worker.executor.shutdown()
+    worker.executor = InlineExecutor()
+
+    assert _submit_in_thread(worker, 3), "submit() deadlocked on a job that completed inline"
+    stats = worker.stats()
+    assert stats["completed"] == 3
+    assert not stats["busy"]
+    assert worker.latest()["timestamp"] == "t2"
+
+
+def test_instant_jobs_on_thread_executor():
+    worker = AnalysisWorker(InstantUtils())
+    try:
+        assert _submit_in_thread(worker, 200)
+        deadline = time.monotonic() + 5
+        while worker.stats()["busy"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        stats = worker.stats()
+        assert not stats["busy"]
+        assert stats["submitted"] == 200
+        assert stats["completed"] + stats["dropped"] == 200
+        # Keep-newest: the last submitted frame is always analyzed
+        assert worker.latest()["timestamp"] == "t199"
+        assert worker.latest()["objects"] == [[], []]
+    finally:
+        worker.shutdown()
@@ -0,0 +1,127 @@
+import cv2
+import numpy as np
+import pytest
+from utils import ImageRecognitionUtils
+
+CLASSES = [f"class{i}" for i in range(80)]
+# yolov4-tiny at 416x416: 13x13 and 26x26 grids with 3 anchors each
+ROWS = (507, 2028)
+
+
+def reference_parse(outputs, width, height, conf_threshold, nms_threshold=0.4, per_class_nms=False):
+    """
+    The original row-by-row parser, kept as the reference. Per-class NMS runs
+    NMSBoxes once per class.
+    """
+    boxes = []
+    class_ids = []
+    confidences = []
+    for output in outputs:
+        for detection in output:
+            scores = detection[5:]
+            class_id = int(np.argmax(scores))
+            confidence = scores[class_id]
+            if confidence > conf_threshold:
+                center_x = int(detection[0] * width)
+                center_y = int(detection[1] * height)
+                w = int(detection[2] * width)
+                h = int(detection[3] * height)
+                x = int(center_x - w / 2)
+                y = int(center_y - h / 2)
+                boxes.append([x, y, w, h])
+                class_ids.append(class_id)
+                confidences.append(float(confidence))
+
+    if per_class_nms:
+        indices = []
+        for class_id in sorted(set(class_ids)):
+            members = [i for i, c in enumerate(class_ids) if c == class_id]
+            keep = cv2.dnn.NMSBoxes([boxes[i] for i in members], [confidences[i] for i in members],
+                                    conf_threshold, nms_threshold)
+            indices += [members[k] for k in np.asarray(keep, dtype=int).reshape(-1)]
+    else:
+        indices = np.asarray(cv2.dnn.NMSBoxes(boxes, confidences, conf_threshold, nms_threshold),
+                             dtype=int).reshape(-1)
+
+    return [{"box": boxes[i], "label": CLASSES[class_ids[i]], "confidence": confidences[i]}
+            for i in indices]
+
+
+def random_outputs(rng, candidates=0.05, classes=4):
+    """
+    yolov4-tiny shaped outputs: low background scores, a few confident rows,
+    and jittered copies of them so NMS has overlaps to suppress.
+    """
+    outputs = []
+    for rows in ROWS:
+        out = np.zeros((rows, 85), dtype=np.float32)
+        out[:, :2] = rng.random((rows, 2))
+        out[:, 2:4] = rng.random((rows, 2)) * 0.4 + 0.01
+        out[:, 4] = rng.random(rows)
+        out[:, 5:] = rng.random((rows, 80)) * 0.3
+        hits = rng.choice(rows, int(rows * candidates), replace=False)
+        out[hits, 5 + rng.integers(0, classes, len(hits))] = rng.uniform(0.5, 1.0, len(hits))
+        copies = hits[:len(hits) // 2]
+        targets = rng.choice(np.setdiff1d(np.arange(rows), hits), len(copies), replace=False)
+        out[targets] = out[copies]
+        out[targets, :4] += rng.normal(0, 0.01, (len(copies), 4)).astype(np.float32)
+        out[targets, 5:] *= rng.uniform(0.9, 1.0, (len(copies), 1)).astype(np.float32)
+        outputs.append(out)
+    return outputs
+
+
+def canonical(detections):
+    return sorted((-d["confidence"], d["label"], list(map(int, d["box"]))) for d in detections)
+
+
+@pytest.fixture(scope="module")
+def utils():
+    vision_utils = ImageRecognitionUtils(lazy=True)
+    vision_utils.yolo_classes = CLASSES
+    return vision_utils
+
+
+@pytest.mark.parametrize("per_class_nms", [False, True])
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_reference(utils, seed, per_class_nms):
+    rng = np.random.default_rng(seed)
+    outputs = random_outputs(rng)
+    width, height = int(rng.integers(32, 1280)), int(rng.integers(32, 720))
+
+    expected = reference_parse(outputs, width, height, 0.5, per_class_nms=per_class_nms)
+    actual = utils._parse_outputs(outputs, width, height, 0.5, per_class_nms=per_class_nms)
+
+    assert expected
+    assert canonical(actual) == canonical(expected)
+    for det in actual:
+        assert all(type(v) is int for v in det["box"])
+        assert type(det["confidence"]) is float
+
+
+@pytest.mark.parametrize("per_class_nms", [False, True])
+def test_no_candidates(utils, per_class_nms):
+    outputs = [np.full((rows, 85), 0.1, dtype=np.float32) for rows in ROWS]
+    assert utils._parse_outputs(outputs, 416, 416, 0.5, per_class_nms=per_class_nms) == []
+    assert reference_parse(outputs, 416, 416, 0.5, per_class_nms=per_class_nms) == []
+
+
+@pytest.mark.parametrize("per_class_nms", [False, True])
+def test_border_boxes(utils, per_class_nms):
+    # Boxes hanging over the ROI edges: negative and fractional corners that int() truncates toward zero
+    rows = np.array([
+        [0.003, 0.011, 0.37, 0.29],
+        [0.997, 0.989, 0.41, 0.33],
+        [0.021, 0.975, 0.13, 0.07],
+        [0.985, 0.017, 0.09, 0.11],
+        [0.5, 0.5, 1.3, 1.7],
+    ], dtype=np.float32)
+    out = np.zeros((len(rows), 85), dtype=np.float32)
+    out[:, :4] = rows
+    out[np.arange(len(rows)), 5 + np.arange(len(rows)) % 2] = np.linspace(0.95, 0.6, len(rows))
+    outputs = [out, np.zeros((4, 85), dtype=np.float32)]
+
+    for width, height in [(37, 53), (101, 33), (640, 480)]:
+        expected = reference_parse(outputs, width, height, 0.5, per_class_nms=per_class_nms)
+        actual = utils._parse_outputs(outputs, width, height, 0.5, per_class_nms=per_class_nms)
+        assert any(min(d["box"][:2]) < 0 for d in expected)
+        assert canonical(actual) == canonical(expected)
@@ -0,0 +1,280 @@
+import time
+import cv2
+import numpy as np
+from roi_manager import rects_contain, rects_iou
+
+# Optional OpenCV single-object trackers, by name. Which ones exist depends on
+# the OpenCV build (KCF/CSRT need opencv-contrib); "iou" needs none of them.
+CV_TRACKERS = {
+    "kcf": "TrackerKCF_create",
+    "csrt": "TrackerCSRT_create",
+    "mil": "TrackerMIL_create",
+}
+
+
+def _cv_tracker_factory(backend):
+    name = CV_TRACKERS.get(backend)
+    if name is None:
+        return None
+    factory = getattr(cv2, name, None)
+    if factory is None and hasattr(cv2, "legacy"):
+        factory = getattr(cv2.legacy, name, None)
+    return factory
+
+
+def box_iou(boxes_a, boxes_b):
+    """
+    (N, M) intersection-over-union matrix between two sets of [x, y, w, h] boxes.
+    """
+    a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+    return rects_iou(np.hstack([a[:, :2], a[:, :2] + a[:, 2:]]), np.hstack([b[:, :2], b[:, :2] + b[:, 2:]]))
+
+
+class Track:
+    """
+    One tracked object: a stable ID, its latest box and the ROIs it is in.
+    """
+    def __init__(self, track_id, detection, frame_index):
+        self.id = track_id
+        self.label = detection["label"]
+        self.confidence = detection["confidence"]
+        self.box = np.asarray(detection["box"], dtype=np.float64)
+        self.velocity = np.zeros(2)
+        self.detected_center = self.center
+        self.detected_frame = frame_index
+        self.missed = 0
+        self.cv_tracker = None
+        # ROI number -> (entered timestamp, entered monotonic time, dwell reported)
+        self.inside = {}
+
+    @property
+    def center(self):
+        return self.box[:2] + self.box[2:] / 2
+
+    def as_dict(self):
+        return {"id": self.id, "label": self.label, "confidence": self.confidence,
+                "box": [int(round(v)) for v in self.box], "rois": sorted(self.inside)}
+
+
+class ObjectTracker:
+    """
+    Detect-then-track object monitoring.
+    Full YOLO detection over all ROIs runs every `detect_interval` frames (or
+    sooner after request_detection() or an ROI change). Detections are matched
+    to existing tracks by IoU, falling back to centroid distance for the same
+    label, so objects keep their ID between detections. In between, boxes are
+    moved by their last velocity ("iou" backend) or by an OpenCV tracker
+    ("kcf", "csrt", "mil" where available).
+    A track is inside a ROI while its center is; enter, exit and dwell (inside
+    longer than `dwell_seconds`) events are printed and logged.
+    """
+    def __init__(self, vision_utils, logger=None, detect_interval=10, iou_threshold=0.3,
+                 max_missed=3, dwell_seconds=10.0, backend="iou"):
+        self.vision_utils = vision_utils
+        self.logger = logger
+        self.detect_interval = max(1, int(detect_interval))
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.dwell_seconds = dwell_seconds
+        self.backend = backend.lower()
+        self.cv_factory = None
+        if self.backend != "iou":
+            self.cv_factory = _cv_tracker_factory(self.backend)
+            if self.cv_factory is None:
+                print(f"[Tracks] OpenCV tracker '{backend}' not available in this build, using IoU tracking.")
+                self.backend = "iou"
+
+        self.tracks = []
+        self.next_id = 1
+        self.rects = None
+        self.frames_since_detect = None
+        self.detect_requested = False
+
+        # Counters
+        self.frames = 0
+        self.detections_run = 0
+
+    def request_detection(self):
+        """
+        Run full detection on the next update instead of waiting for the interval.
+        """
+        self.detect_requested = True
+
+    def update(self, frame, rects, timestamp=None, now=None):
+        """
+        Process one frame and return the current tracks as dicts
+        (id, label, confidence, box in frame coordinates, ROI numbers).
+        """
+        now = time.monotonic() if now is None else now
+        self.frames += 1
+        rects = list(rects)
+        if rects != self.rects:
+            self.rects = rects
+            self.detect_requested = True
+
+        if (self.detect_requested or self.frames_since_detect is None
+                or self.frames_since_detect + 1 >= self.detect_interval):
+            self._detect(frame, rects, timestamp, now)
+        else:
+            self.frames_since_detect += 1
+            self._propagate(frame)
+
+        self._update_rois(rects, timestamp, now)
+        return [track.as_dict() for track in self.tracks]
+
+    def _detect(self, frame, rects, timestamp, now):
+        self.detect_requested = False
+        self.frames_since_detect = 0
+        self.detections_run += 1
+
+        rois = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in rects]
+        offsets = [(x1, y1) for x1, y1, _, _ in rects]
+        detections = [d for dets in self.vision_utils.detect_objects_batch(rois, offsets) for d in dets]
+        if len(rects) > 1 and len(detections) > 1:
+            # Overlapping ROIs see the same object twice
+            keep = cv2.dnn.NMSBoxes([d["box"] for d in detections],
+                                    [d["confidence"] for d in detections], 0.0, 0.5)
+            detections = [detections[i] for i in np.asarray(keep, dtype=int).reshape(-1)]
+
+        matches, unmatched_tracks, unmatched_dets = self._associate(detections)
+        for t, d in matches:
+            track = self.tracks[t]
+            det = detections[d]
+            track.box = np.asarray(det["box"], dtype=np.float64)
+            track.velocity = (track.center - track.detected_center) / max(1, self.frames - track.detected_frame)
+            track.detected_center = track.center
+            track.detected_frame = self.frames
+            track.label = det["label"]
+            track.confidence = det["confidence"]
+            track.missed = 0
+            self._init_cv_tracker(track, frame)
+
+        for t in unmatched_tracks:
+            self.tracks[t].missed += 1
+        lost = [self.tracks[t] for t in unmatched_tracks if self.tracks[t].missed > self.max_missed]
+
+        for d in unmatched_dets:
+            track = Track(self.next_id, detections[d], self.frames)
+            self.next_id += 1
+            self._init_cv_tracker(track, frame)
+            self.tracks.append(track)
+
+        for track in lost:
+            self.tracks.remove(track)
+            self._leave_all(track, timestamp, now)
+
+    def _associate(self, detections):
+        """
+        Greedy one-to-one matching: highest IoU first, then nearest center of the same label.
+        """
+        if not self.tracks or not detections:
+            return [], list(range(len(self.tracks))), list(range(len(detections)))
+
+        det_boxes = np.array([d["box"] for d in detections], dtype=np.float64)
+        iou = box_iou([t.box for t in self.tracks], det_boxes)
+        matches = []
+        free_tracks = set(range(len(self.tracks)))
+        free_dets = set(range(len(detections)))
+        for t, d in zip(*np.unravel_index(np.argsort(-iou, axis=None), iou.shape)):
+            if iou[t, d] < self.iou_threshold:
+                break
+            if t in free_tracks and d in free_dets:
+                matches.append((int(t), int(d)))
+                free_tracks.discard(t)
+                free_dets.discard(d)
+
+        if free_tracks and free_dets:
+            # Fast movers can jump past any overlap between detections
+            tracks = sorted(free_tracks)
+            dets = sorted(free_dets)
+            centers = np.array([self.tracks[t].center for t in tracks])
+            det_centers = det_boxes[dets, :2] + det_boxes[dets, 2:] / 2
+            distance = np.linalg.norm(centers[:, None] - det_centers[None, :], axis=2)
+            reach = np.array([np.hypot(*self.tracks[t].box[2:]) for t in tracks])
+            for i, j in zip(*np.unravel_index(np.argsort(distance, axis=None), distance.shape)):
+                t, d = tracks[i], dets[j]
+                if distance[i, j] > reach[i]:
+                    break
+                if t in free_tracks and d in free_dets and self.tracks[t].label == detections[d]["label"]:
+                    matches.append((t, d))
+                    free_tracks.discard(t)
+                    free_dets.discard(d)
+        return matches, sorted(free_tracks), sorted(free_dets)
+
+    def _init_cv_tracker(self, track, frame):
+        if self.cv_factory is None:
+            return
+        x, y, w, h = (int(v) for v in track.box)
+        if w < 2 or h < 2:
+            track.cv_tracker = None
+            return
+        track.cv_tracker = self.cv_factory()
+        track.cv_tracker.init(frame, (x, y, w, h))
+
+    def _propagate(self, frame):
+        for track in self.tracks:
+            if track.cv_tracker is not None:
+                ok, box = track.cv_tracker.update(frame)
+                if ok:
+                    track.box = np.asarray(box, dtype=np.float64)
+                continue
+            track.box[:2] += track.velocity
+
+    def _update_rois(self, rects, timestamp, now):
+        if not self.tracks:
+            return
+        inside = rects_contain(rects, [track.center for track in self.tracks])
+
+        for j, track in enumerate(self.tracks):
+            current = {int(i) + 1 for i in np.flatnonzero(inside[:, j])}
+            for roi in sorted(current - set(track.inside)):
+                track.inside[roi] = (timestamp, now, False)
+                self._log({"event": "entered", "track": track.id, "label": track.label,
+                           "roi": roi, "timestamp": timestamp})
+            for roi in sorted(set(track.inside) - current):
+                self._leave(track, roi, timestamp, now)
+            for roi in current:
+                since, entered, reported = track.inside[roi]
+                if not reported and now - entered >= self.dwell_seconds:
+                    track.inside[roi] = (since, entered, True)
+                    self._log({"event": "dwell", "track": track.id, "label": track.label, "roi": roi,
+                               "timestamp": timestamp, "duration": now - entered})
+
+    def _leave(self, track, roi, timestamp, now, lost=False):
+        since, entered, _ = track.inside.pop(roi)
+        self._log({"event": "lost" if lost else "left", "track": track.id, "label": track.label,
+                   "roi": roi, "timestamp": timestamp, "entered_at": since, "duration": now - entered})
+
+    def _leave_all(self, track, timestamp, now):
+        for roi in sorted(track.inside):
+            self._leave(track, roi, timestamp, now, lost=True)
+
+    def _log(self, event):
+        name = f"Track {event['track']} ({event['label']})"
+        if event["event"] == "entered":
+            message = f"{name} entered ROI {event['roi']}"
+        elif event["event"] == "dwell":
+            message = f"{name} dwelling in ROI {event['roi']} for {event['duration']:.1f}s"
+        elif event["event"] == "left":
+            message = f"{name} left ROI {event['roi']} after {event['duration']:.1f}s"
+        else:
+            message = f"{name} lost in ROI {event['roi']} after {event['duration']:.1f}s"
+        print(f"[Tracks] {message}")
+        if self.logger is not None:
+            self.logger.log(event["timestamp"], message)
+
+    def reset(self):
+        now = time.monotonic()
+        for track in self.tracks:
+            self._leave_all(track, None, now)
+        self.tracks = []
+        self.frames_since_detect = None
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "detections_run": self.detections_run,
+            "detect_ratio": self.detections_run / self.frames if self.frames else 0.0,
+            "active_tracks": len(self.tracks),
+        }
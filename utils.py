@@ -1,12 +1,81 @@
 import cv2
 import os
+import threading
+import time
 import numpy as np
+from config import MODEL_INPUT_SIZE, MODEL_BACKEND, MODEL_TARGET
+
+# OpenCV DNN backends and targets by name; entries missing from this build are skipped.
+# The *_fp16 targets run the network in half precision.
+DNN_BACKENDS = {name: getattr(cv2.dnn, attr) for name, attr in {
+    "opencv": "DNN_BACKEND_OPENCV",
+    "openvino": "DNN_BACKEND_INFERENCE_ENGINE",
+    "cuda": "DNN_BACKEND_CUDA",
+    "vulkan": "DNN_BACKEND_VKCOM",
+}.items() if hasattr(cv2.dnn, attr)}
+DNN_TARGETS = {name: getattr(cv2.dnn, attr) for name, attr in {
+    "cpu": "DNN_TARGET_CPU",
+    "cpu_fp16": "DNN_TARGET_CPU_FP16",
+    "opencl": "DNN_TARGET_OPENCL",
+    "opencl_fp16": "DNN_TARGET_OPENCL_FP16",
+    "cuda": "DNN_TARGET_CUDA",
+    "cuda_fp16": "DNN_TARGET_CUDA_FP16",
+    "vulkan": "DNN_TARGET_VULKAN",
+}.items() if hasattr(cv2.dnn, attr)}
+
+# Network input sizes to choose from with input_size="auto"
+INPUT_SIZES = (320, 416, 608)
+
 
 class ImageRecognitionUtils:
-    def __init__(self):
+    """
+    YOLOv4-Tiny object detection and ROI color checks.
+    With `lazy=True` the network is only read from disk on first use (or on
+    preload(), which loads it on a background thread). Loading ends with a
+    warm-up forward pass so the first real detection isn't the slow one.
+    `input_size` is 320, 416 or 608 (any multiple of 32 works), or "auto" to
+    pick the smallest size that covers the largest ROI of each call.
+    """
+    def __init__(self, lazy=False, input_size=MODEL_INPUT_SIZE, backend=MODEL_BACKEND, target=MODEL_TARGET):
         self.yolo_net = None
         self.yolo_classes = []
+        self.output_layers = []
+        self.input_size = input_size
+        self.backend = backend
+        self.target = target
+        self.load_lock = threading.Lock()
+        self.loaded = False
+
+        # Timings (seconds)
+        self.load_time = None
+        self.warmup_time = None
+        self.inferences = 0
+        self.inference_time = 0.0
+        self.last_inference = None
+
+        if not lazy:
+            self.load()
+
+    def load(self):
+        """
+        Load the network and class labels, if not done yet. Safe to call from several threads.
+        """
+        if self.loaded:
+            return
+        with self.load_lock:
+            if self.loaded:
+                return
+            self._load()
+            self.loaded = True
+
+    def preload(self):
+        """
+        Start loading in the background so the first detection doesn't wait for disk.
+        """
+        if not self.loaded:
+            threading.Thread(target=self.load, name="ModelLoader", daemon=True).start()
 
+    def _load(self):
         # Paths to model files
         cfg_path = "models/yolov4-tiny.cfg"
         weights_path = "models/yolov4-tiny.weights"
@@ -16,10 +85,18 @@ class ImageRecognitionUtils:
         # Load YOLO network
         if os.path.exists(cfg_path) and os.path.exists(weights_path):
             try:
-                self.yolo_net = cv2.dnn.readNetFromDarknet(cfg_path, weights_path)
-                self.yolo_net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
-                self.yolo_net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
-                print("[Objects] YOLOv4-Tiny loaded successfully from .cfg and .weights")
+                t0 = time.perf_counter()
+                net = cv2.dnn.readNetFromDarknet(cfg_path, weights_path)
+                backend, target = self._select_backend()
+                net.setPreferableBackend(DNN_BACKENDS[backend])
+                net.setPreferableTarget(DNN_TARGETS[target])
+                # Resolve output layers once instead of on every forward pass
+                self.output_layers = list(net.getUnconnectedOutLayersNames())
+                self.load_time = time.perf_counter() - t0
+                self.warmup_time = self._warm_up(net)
+                self.yolo_net = net
+                print(f"[Objects] YOLOv4-Tiny loaded in {self.load_time * 1000:.0f} ms "
+                      f"(warm-up {self.warmup_time * 1000:.0f} ms, {backend}/{target}, input {self.input_size})")
             except Exception as e:
                 print("[Objects] Failed to load YOLOv4-Tiny:", e)
         else:
@@ -36,10 +113,75 @@ class ImageRecognitionUtils:
         else:
             print("[Objects] coco.names file missing in models/")
 
-    def detect_objects(self, roi, conf_threshold=0.5):
+    def _select_backend(self):
+        """
+        Validate the configured backend/target, falling back to OpenCV on the CPU.
+        """
+        backend, target = self.backend, self.target
+        if backend not in DNN_BACKENDS or target not in DNN_TARGETS:
+            print(f"[Objects] Unknown DNN backend/target {backend}/{target}, using opencv/cpu.")
+            return "opencv", "cpu"
+        try:
+            available = cv2.dnn.getAvailableTargets(DNN_BACKENDS[backend])
+        except Exception:
+            available = []
+        if DNN_TARGETS[target] not in list(available):
+            print(f"[Objects] DNN backend/target {backend}/{target} not available in this build, using opencv/cpu.")
+            return "opencv", "cpu"
+        return backend, target
+
+    def _warm_up(self, net):
+        """
+        Run one forward pass per input size that may be used; returns the time taken.
+        """
+        sizes = INPUT_SIZES if self.input_size == "auto" else (self.input_size,)
+        t0 = time.perf_counter()
+        for size in sizes:
+            net.setInput(np.zeros((1, 3, size, size), dtype=np.float32))
+            net.forward(self.output_layers)
+        return time.perf_counter() - t0
+
+    def network_size(self, rois):
+        """
+        Square network input size for a set of ROIs.
+        """
+        if self.input_size != "auto":
+            return int(self.input_size)
+        largest = max(max(roi.shape[:2]) for roi in rois)
+        for size in INPUT_SIZES:
+            if size >= largest:
+                return size
+        return INPUT_SIZES[-1]
+
+    def _forward(self, blob):
+        t0 = time.perf_counter()
+        self.yolo_net.setInput(blob)
+        outputs = self.yolo_net.forward(self.output_layers)
+        elapsed = time.perf_counter() - t0
+        self.inferences += 1
+        self.inference_time += elapsed
+        self.last_inference = elapsed
+        return outputs
+
+    def stats(self):
+        """
+        Startup and per-inference cost, in milliseconds.
+        """
+        ms = lambda seconds: seconds * 1000 if seconds is not None else None
+        return {
+            "loaded": self.yolo_net is not None,
+            "load_ms": ms(self.load_time),
+            "warmup_ms": ms(self.warmup_time),
+            "inferences": self.inferences,
+            "mean_inference_ms": self.inference_time / self.inferences * 1000 if self.inferences else 0.0,
+            "last_inference_ms": ms(self.last_inference),
+        }
+
+    def detect_objects(self, roi, conf_threshold=0.5, per_class_nms=False):
         """
         Detect objects in ROI using YOLOv4 Tiny and return bounding boxes.
         """
+        self.load()
         if self.yolo_net is None:
             print("⚠️ YOLO model not loaded, skipping detection.")
             return []
@@ -48,58 +190,111 @@ class ImageRecognitionUtils:
             return []
 
         try:
-            blob = cv2.dnn.blobFromImage(roi, scalefactor=1/255.0, size=(416, 416),
+            size = self.network_size([roi])
+            blob = cv2.dnn.blobFromImage(roi, scalefactor=1/255.0, size=(size, size),
                                         swapRB=True, crop=False)
-            self.yolo_net.setInput(blob)
-            layer_names = self.yolo_net.getLayerNames()
-            output_layers = [layer_names[i - 1] for i in self.yolo_net.getUnconnectedOutLayers()]
-            outputs = self.yolo_net.forward(output_layers)
+            outputs = self._forward(blob)
         except Exception as e:
             print(f"⚠️ Error running YOLO detection: {e}")
             return []
 
         height, width = roi.shape[:2]
-        boxes = []
-        class_ids = []
-        confidences = []
-
-        # Parse YOLO outputs
-        for output in outputs:
-            for detection in output:
-                scores = detection[5:]
-                class_id = int(np.argmax(scores))
-                confidence = scores[class_id]
-                if confidence > conf_threshold:
-                    center_x = int(detection[0] * width)
-                    center_y = int(detection[1] * height)
-                    w = int(detection[2] * width)
-                    h = int(detection[3] * height)
-                    x = int(center_x - w / 2)
-                    y = int(center_y - h / 2)
-
-                    boxes.append([x, y, w, h])
-                    class_ids.append(class_id)
-                    confidences.append(float(confidence))
+        return self._parse_outputs(outputs, width, height, conf_threshold,
+                                   per_class_nms=per_class_nms)
+
+    def detect_objects_batch(self, rois, offsets=None, conf_threshold=0.5, per_class_nms=False):
+        """
+        Detect objects in several ROIs with a single forward pass.
+        `offsets` holds the (x, y) frame position of each ROI; when given,
+        boxes are returned in frame coordinates instead of ROI coordinates.
+        Returns one list of detections per ROI, in input order.
+        """
+        results = [[] for _ in rois]
+        self.load()
+        if self.yolo_net is None:
+            print("⚠️ YOLO model not loaded, skipping detection.")
+            return results
+
+        # ROIs too small for the network are left with no detections
+        valid = [i for i, roi in enumerate(rois)
+                 if roi.shape[0] >= 32 and roi.shape[1] >= 32]
+        if not valid:
+            return results
+
+        try:
+            size = self.network_size([rois[i] for i in valid])
+            blob = cv2.dnn.blobFromImages([rois[i] for i in valid], scalefactor=1/255.0,
+                                          size=(size, size), swapRB=True, crop=False)
+            outputs = self._forward(blob)
+        except Exception as e:
+            print(f"⚠️ Error running YOLO detection: {e}")
+            return results
+
+        # A single image comes back as (rows, 85), a batch as (N, rows, 85)
+        outputs = [out.reshape(len(valid), -1, out.shape[-1]) for out in outputs]
+
+        for n, i in enumerate(valid):
+            height, width = rois[i].shape[:2]
+            detections = self._parse_outputs([out[n] for out in outputs],
+                                             width, height, conf_threshold,
+                                             per_class_nms=per_class_nms)
+            if offsets is not None:
+                ox, oy = offsets[i]
+                for det in detections:
+                    bx, by, bw, bh = det["box"]
+                    det["box"] = [bx + ox, by + oy, bw, bh]
+            results[i] = detections
+        return results
+
+    def _parse_outputs(self, outputs, width, height, conf_threshold,
+                       nms_threshold=0.4, per_class_nms=False):
+        """
+        Turn raw YOLO output rows into NMS-filtered detections for one image.
+        Works on whole output arrays at once rather than row by row.
+        """
+        rows = np.concatenate([out.reshape(-1, out.shape[-1]) for out in outputs])
+
+        # Confidence masking before argmax: only a handful of rows survive
+        scores = rows[:, 5:]
+        keep = scores.max(axis=1) > conf_threshold
+        if not keep.any():
+            return []
+        rows = rows[keep]
+        scores = scores[keep]
+        class_ids = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), class_ids]
+
+        # Center/size to top-left boxes, truncating like int() does
+        center_x = np.trunc(rows[:, 0] * width)
+        center_y = np.trunc(rows[:, 1] * height)
+        w = np.trunc(rows[:, 2] * width)
+        h = np.trunc(rows[:, 3] * height)
+        x = np.trunc(center_x - w / 2)
+        y = np.trunc(center_y - h / 2)
+        boxes = np.stack([x, y, w, h], axis=1).astype(int)
 
         # Apply Non-Maximum Suppression (to remove duplicates)
-        indices = cv2.dnn.NMSBoxes(boxes, confidences, conf_threshold, 0.4)
+        nms_boxes = boxes
+        if per_class_nms:
+            # Shift each class far apart so boxes of different classes never overlap
+            shift = 4 * int(np.abs(boxes).max()) + 1
+            nms_boxes = boxes.copy()
+            nms_boxes[:, :2] += class_ids[:, None] * shift
+        indices = cv2.dnn.NMSBoxes(nms_boxes.tolist(), confidences.tolist(),
+                                   conf_threshold, nms_threshold)
+        indices = np.asarray(indices, dtype=int).reshape(-1)
 
         results = []
-        if len(indices) > 0:
-            # Fix for OpenCV version differences
-            if isinstance(indices, (tuple, list)):
-                indices = [i[0] if isinstance(i, (list, np.ndarray)) else i for i in indices]
-
-            for i in indices:
-                label = self.yolo_classes[class_ids[i]] if self.yolo_classes else str(class_ids[i])
-                results.append({
-                    "box": boxes[i],
-                    "label": label,
-                    "confidence": confidences[i]
-                })
+        for i in indices:
+            class_id = int(class_ids[i])
+            label = self.yolo_classes[class_id] if self.yolo_classes else str(class_id)
+            results.append({
+                "box": boxes[i].tolist(),
+                "label": label,
+                "confidence": float(confidences[i])
+            })
         return results
 
-    
     def detect_color_change(self, roi, target_bgr, threshold=30):
         """
         Compare the mean color of the ROI to the target color.